@@ -0,0 +1,24 @@
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calc_engine import BACKENDS, evaluate_expression, evaluate_text  # noqa: E402
+
+# Cost of each numeric backend on warm (cached) expressions. Usage: python benchmarks/bench_backends.py
+
+EXPRESSIONS = ["0.1+0.2", "12+34*5-6/7", "(1+2)**3%5", "1/3*3", "2**64-1", "9*8-7+6/5*4"]
+
+
+def main(number=20000):
+    for backend in BACKENDS:
+        for expression in EXPRESSIONS: evaluate_expression(expression, backend)
+        evaluate_time = timeit.timeit(lambda: [evaluate_expression(e, backend) for e in EXPRESSIONS], number=number)
+        text_time = timeit.timeit(lambda: [evaluate_text(e, backend) for e in EXPRESSIONS], number=number)
+        per_call = 1e6 / (number * len(EXPRESSIONS))
+        print(f"{backend:>8}: evaluate {evaluate_time * per_call:6.2f} us, evaluate + format {text_time * per_call:6.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+import os
+import statistics
+import subprocess
+import sys
+
+# Cold-import benchmark for the core: runs a fresh interpreter per sample and reads
+# the cumulative time of the module from -X importtime. Usage: python benchmarks/bench_import.py [module] [runs]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_time_us(module):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import sys, {module}; assert 'customtkinter' not in sys.modules"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    for line in proc.stderr.splitlines():
+        fields = [field.strip() for field in line.split("|")]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1])
+    raise RuntimeError(f"{module} not found in importtime output")
+
+
+def main():
+    module = sys.argv[1] if len(sys.argv) > 1 else "calc_logic"
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    samples = [import_time_us(module) for _ in range(runs)]
+    print(f"{module}: median {statistics.median(samples) / 1000:.2f} ms, min {min(samples) / 1000:.2f} ms over {runs} runs")
+
+
+if __name__ == "__main__":
+    main()
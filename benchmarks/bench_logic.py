@@ -0,0 +1,171 @@
+import argparse
+import json
+import os
+import sys
+import timeit
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calc_logic import CalculationLogic  # noqa: E402
+
+# Benchmarks for the CalculationLogic hot paths, stdlib only (timeit).
+#   python benchmarks/bench_logic.py --save baseline.json
+#   python benchmarks/bench_logic.py --compare baseline.json --threshold 0.10
+# --compare exits with status 1 when any benchmark is slower than baseline * (1 + threshold).
+
+EXPRESSIONS = ["12+34*5-6/7", "(1+2)**3%5", "9*8-7+6/5*4", "2**10-1", "7/2"]
+KEYS = list("12") + ["+"] + list("345") + ["*"] + ["("] + list("67") + ["-"] + list("8") + [")"] + ["/", "9", "="]
+
+
+def press(logic, key):
+    if key == "=": logic.evaluate()
+    elif key in "0123456789.": logic.add_to_expression(key)
+    else: logic.append_operator(key)
+
+
+def keystrokes(logic, count=1000):
+    for i in range(count): press(logic, KEYS[i % len(KEYS)])
+
+
+def bench_evaluate():
+    # "=" on expressions already entered: the token lists are built once, outside the timing,
+    # since assigning total_expression re-tokenizes and would dominate the measurement
+    logic, token_lists = CalculationLogic(), []
+    for expression in EXPRESSIONS:
+        logic.total_expression = expression
+        token_lists.append(logic._tokens)
+
+    def run():
+        for tokens in token_lists:
+            logic._tokens, logic.current_expression = tokens, ""
+            logic.evaluate()
+    return run, len(EXPRESSIONS)
+
+
+def bench_eval_reference():
+    # the pre-engine implementation, kept as the yardstick
+    def run():
+        for expression in EXPRESSIONS: eval(expression)
+    return run, len(EXPRESSIONS)
+
+
+def bench_format_result():
+    logic, values = CalculationLogic(), [3, 3.5, 1 / 3, 2 ** 64, -0.25]
+
+    def run():
+        for value in values: logic.format_result(value)
+    return run, len(values)
+
+
+def bench_format_expression_for_history():
+    logic = CalculationLogic()
+
+    def run():
+        for expression in EXPRESSIONS: logic.format_expression_for_history(expression)
+    return run, len(EXPRESSIONS)
+
+
+def bench_scientific(method, inputs):
+    def factory():
+        logic = CalculationLogic()
+        func = getattr(logic, method)
+
+        def run():
+            for value in inputs:
+                logic.current_expression = value
+                func()
+        return run, len(inputs)
+    return factory
+
+
+def bench_keystrokes():
+    def run(): keystrokes(CalculationLogic())
+    return run, 1000
+
+
+def bench_update_display():
+    try:
+        from calc_ui import CalculatorUI
+    except ImportError:
+        return None
+    label = SimpleNamespace(configure=lambda **options: None)
+    ui = CalculatorUI.__new__(CalculatorUI)
+    ui._init_state(SimpleNamespace(after=lambda ms, callback: None), CalculationLogic())
+    ui.label = ui.total_label = label
+    keystrokes(ui.logic, 15)
+
+    def run():
+        # one keystroke's worth: schedule, then the frame flush with an alternating text
+        ui._update_display()
+        ui._shown_text = ""
+        ui._flush_display()
+    return run, 1
+
+
+ANGLES, VALUES = ["0", "30", "45", "60", "90"], ["2", "10", "0.5", "100", "7"]
+BENCHMARKS = {
+    "evaluate": bench_evaluate,
+    "eval_reference": bench_eval_reference,
+    "format_result": bench_format_result,
+    "format_expression_for_history": bench_format_expression_for_history,
+    "trigo_sin": bench_scientific("trigo_sin", ANGLES),
+    "trigo_cos": bench_scientific("trigo_cos", ANGLES),
+    "trigo_tan": bench_scientific("trigo_tan", ANGLES),
+    "calculate_log": bench_scientific("calculate_log", VALUES),
+    "calculate_ln": bench_scientific("calculate_ln", VALUES),
+    "calculate_sqrt": bench_scientific("calculate_sqrt", VALUES),
+    "calculate_factorial": bench_scientific("calculate_factorial", ["5", "10", "20", "100", "170"]),
+    "keystrokes_1000": bench_keystrokes,
+    "update_display": bench_update_display,
+}
+
+
+def measure(factory, repeat=5, min_time=0.2):
+    benchmark = factory()
+    if benchmark is None: return None
+    run, ops = benchmark
+    timer = timeit.Timer(run)
+    number, _ = timer.autorange()
+    number = max(number, int(number * min_time / 0.2))
+    return min(timer.repeat(repeat=repeat, number=number)) / (number * ops)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CalculationLogic hot-path benchmarks")
+    parser.add_argument("--save", metavar="FILE", help="write results as baseline JSON")
+    parser.add_argument("--compare", metavar="FILE", help="compare against a baseline JSON")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown ratio (default 0.10)")
+    parser.add_argument("names", nargs="*", help="benchmarks to run (default: all)")
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f: baseline = json.load(f)
+
+    results, regressions = {}, []
+    for name in args.names or BENCHMARKS:
+        seconds = measure(BENCHMARKS[name])
+        if seconds is None:
+            print(f"{name:<32} skipped (customtkinter not installed)")
+            continue
+        results[name] = seconds
+        line = f"{name:<32} {seconds * 1e6:10.3f} us/op"
+        if name in baseline:
+            ratio = seconds / baseline[name]
+            line += f"  {ratio:6.2f}x baseline"
+            if ratio > 1 + args.threshold:
+                regressions.append(name)
+                line += "  REGRESSION"
+        print(line)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f: json.dump(results, f, indent=2, sort_keys=True)
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,296 +1,94 @@
-import customtkinter as ctk
-import math
-
-LARGE_FONT_STYLE = ("Arial", 40, "bold")
-SMALL_FONT_STYLE = ("Arial", 16)
-DIGITS_FONT_STYLE = ("Arial", 24, "bold")
-DEFAULT_FONT_STYLE = ("Arial", 20)
-HISTORY_FONT_STYLE = ("Arial", 18)
-
-FENER_LACIVERT = "#001450"
-FENER_SARI = "#FBB100"
-FENER_BEYAZ = "#FFFFFF"
-DISPLAY_BG_COLOR = "#DDE2E5"
-ADVANCED_OP_COLOR = "#27AE60"
-DEL_COLOR = "#D60000"
-WHITE = "#FFFFFF"
-
-class CalculationLogic:
-    def __init__(self):
-        self.total_expression = ""
-        self.current_expression = ""
-        self.history = [] 
-
-    def add_to_expression(self, value):
-        self.current_expression += str(value)
-
-    def append_operator(self, operator):
-        if self.current_expression:
-            self.total_expression += self.current_expression
-            self.current_expression = ""
-        self.total_expression += operator
-
-    def delete_last(self):
-        if self.current_expression:
-            self.current_expression = self.current_expression[:-1]
-
-    def clear(self):
-        self.current_expression, self.total_expression = "", ""
-
-    def format_result(self, result):
-        return int(result) if result == int(result) else f"{result:.4f}"
-
-    def evaluate(self):
-        full_expression = self.total_expression + self.current_expression
-        if not full_expression: return
-        
-        try:
-            result = eval(full_expression)
-            formatted_result = self.format_result(result)
-            
-            history_entry = f"{self.format_expression_for_history(full_expression)} = {formatted_result}"
-            self.history.append(history_entry)
-            
-            self.current_expression = str(formatted_result)
-            self.total_expression = ""
-        except Exception:
-            self.current_expression = "Hata"
-            self.total_expression = ""
-
-    def toggle_sign(self):
-        if not self.current_expression: return
-        self.current_expression = self.current_expression[1:] if self.current_expression.startswith('-') else '-' + self.current_expression
-
-    def calculate_sqrt(self):
-        if not self.current_expression: return
-        try:
-            result = math.sqrt(float(self.current_expression))
-            self.current_expression = str(self.format_result(result))
-        except ValueError: self.current_expression = "Hata"
-
-    def calculate_factorial(self):
-        if not self.current_expression: return
-        try:
-            result = math.factorial(int(self.current_expression))
-            self.current_expression = str(self.format_result(result))
-        except (ValueError, TypeError): self.current_expression = "Hata"
-    
-    def trigo_sin(self):
-        if not self.current_expression: return
-        try:
-            val = math.radians(float(self.current_expression))
-            result = math.sin(val)
-            self.current_expression = str(self.format_result(result))
-        except ValueError:
-            self.current_expression = "Hata"
-
-    def trigo_cos(self):
-        if not self.current_expression: return
-        try:
-            val = math.radians(float(self.current_expression))
-            result = math.cos(val)
-            self.current_expression = str(self.format_result(result))
-        except ValueError:
-            self.current_expression = "Hata"
-
-    def trigo_tan(self):
-        if not self.current_expression: return
-        try:
-            val = math.radians(float(self.current_expression))
-            result = math.tan(val)
-            self.current_expression = str(self.format_result(result))
-        except ValueError:
-            self.current_expression = "Hata"
-
-    def calculate_log(self):
-        if not self.current_expression: return
-        try:
-            result = math.log10(float(self.current_expression))
-            self.current_expression = str(self.format_result(result))
-        except ValueError:
-            self.current_expression = "Hata"
-
-    def calculate_ln(self):
-        if not self.current_expression: return
+import argparse
+import sys
+
+from calc_engine import BACKENDS, ExpressionError
+from calc_logic import CalculationLogic
+
+def __getattr__(name):
+    # the window classes pull in customtkinter, so they are only imported when asked for
+    if name in ("CalculatorUI", "CalculatorApp"):
+        import calc_ui
+        return getattr(calc_ui, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def formula_rows(source):
+    # one row of arguments per line, separated by commas or spaces
+    for line in source:
+        yield line.replace(",", " ").split()
+
+def run_batch(source, output, workers=1, chunk_size=None, backend="float", precision=None, formula=None, angle_unit="deg"):
+    if formula is not None:
+        logic = CalculationLogic(backend, precision, angle_unit=angle_unit)
+        results = logic.evaluate_formula_many(logic.define_formula(formula).name, formula_rows(source))
+    elif workers == 1:
+        results = CalculationLogic(backend, precision, angle_unit=angle_unit).evaluate_many(source)
+    else:
+        from calc_parallel import DEFAULT_CHUNK_SIZE, evaluate_parallel
+        results = evaluate_parallel(source, workers=workers, chunk_size=chunk_size or DEFAULT_CHUNK_SIZE,
+                                    backend=backend, precision=precision, angle=angle_unit)
+    for result in results:
+        output.write(f"{result}\n")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="calc", description="OOP Bilimsel Hesap Makinesi")
+    parser.add_argument("--batch", metavar="FILE", help="evaluate one expression per line from FILE ('-' for stdin) without the GUI")
+    parser.add_argument("--formula", metavar="DEFINITION", help="batch mode: apply a formula such as 'f(x, y) = x**2 + sin(y)' to one row of arguments per line")
+    parser.add_argument("--pipeline", metavar="FILE", help="stream a CSV ('-' for stdin) or .parquet file through --expression, appending a result column")
+    parser.add_argument("--expression", metavar="EXPR", help="pipeline mode: expression over column names, e.g. 'sqrt(x**2 + y**2)'")
+    parser.add_argument("--output", metavar="FILE", help="write batch results to FILE instead of stdout")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes for batch mode (0 = one per CPU)")
+    parser.add_argument("--chunk-size", type=int, help="expressions per worker task in batch mode")
+    parser.add_argument("--serve", metavar="ADDRESS", help="run the evaluation service on HOST:PORT or a Unix socket path")
+    parser.add_argument("--history", metavar="FILE", help="keep the GUI history in a persistent store at FILE")
+    parser.add_argument("--metrics", metavar="FILE", help="record per-command latency and write it to FILE on exit (.prom = Prometheus text, otherwise JSON)")
+    parser.add_argument("--record", metavar="FILE", help="record every button/key command of the GUI session to a binary trace")
+    parser.add_argument("--replay", metavar="FILE", help="replay a recorded trace headlessly and report throughput, latency and state diffs")
+    parser.add_argument("--realtime", action="store_true", help="replay with the recorded pacing instead of at full speed")
+    parser.add_argument("--backend", choices=BACKENDS, default="float", help="numeric backend")
+    parser.add_argument("--angle", choices=("deg", "rad"), default="deg", help="angle unit for plain numbers in sin/cos/tan")
+    parser.add_argument("--precision", type=int, help="significant digits for the decimal backend")
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        import asyncio
+        from calc_service import serve
+        asyncio.run(serve(args.serve, args.backend, args.precision, args.workers or None, args.angle))
+        return
+
+    if args.pipeline:
+        if not args.expression: parser.error("--pipeline needs --expression")
+        if args.backend != "float" or args.precision is not None: parser.error("--pipeline evaluates in float64, without --backend or --precision")
+        from calc_pipeline import DEFAULT_CHUNK_ROWS, run_pipeline
         try:
-            result = math.log(float(self.current_expression))
-            self.current_expression = str(self.format_result(result))
-        except ValueError:
-            self.current_expression = "Hata"
-
-    def format_expression_for_history(self, expression):
-        return expression.replace("**", "^").replace("/", "÷").replace("*", "×")
-
-class CalculatorUI:
-    def __init__(self, window, logic):
-        self.window = window
-        self.logic = logic
-        self.history_window_open = False
-
-        self.container_frame = ctk.CTkFrame(window, fg_color=FENER_LACIVERT, corner_radius=0)
-        self.container_frame.pack(expand=True, fill="both")
-
-        self.display_frame = self._create_display_frame()
-        self.buttons_frame = self._create_buttons_frame()
-
-        self.total_label, self.label = self._create_display_labels()
-        
-        for i in range(5): self.buttons_frame.rowconfigure(i, weight=1)
-        for i in range(6): self.buttons_frame.columnconfigure(i, weight=1)
-        
-        self._create_all_buttons()
-        self._bind_keys()
-        
-    def _create_display_frame(self):
-        frame = ctk.CTkFrame(self.container_frame, fg_color=DISPLAY_BG_COLOR, corner_radius=12)
-        frame.pack(expand=True, fill="both", pady=(0, 10))
-        frame.pack_propagate(False)
-        return frame
-
-    def _create_buttons_frame(self):
-        frame = ctk.CTkFrame(self.container_frame, fg_color="transparent")
-        frame.pack(expand=True, fill="both")
-        return frame
-
-    def _create_display_labels(self):
-        total_label = ctk.CTkLabel(self.display_frame, text="", anchor="e", text_color=FENER_LACIVERT, font=SMALL_FONT_STYLE)
-        total_label.pack(expand=True, fill='both', padx=24)
-        label = ctk.CTkLabel(self.display_frame, text="", anchor="e", text_color=FENER_LACIVERT, font=LARGE_FONT_STYLE)
-        label.pack(expand=True, fill='both', padx=24)
-        return total_label, label
-
-    def _update_display(self):
-        self.label.configure(text=self.logic.current_expression[:11])
-        expression = self.logic.total_expression
-        for op, symbol in {"/": " \u00F7 ", "*": " \u00D7 ", "**": " ^ "}.items():
-            expression = expression.replace(op, symbol)
-        self.total_label.configure(text=expression)
-
-    def _make_command(self, func, *args):
-        return lambda: (func(*args), self._update_display())
-
-    def _get_op_symbol(self, op): return {"/": "\u00F7", "*": "\u00D7", "**": " ^ "}.get(op, op)
-
-    def _create_button(self, text, command, row, col, style_options=None, parent=None):
-        if parent is None: parent = self.buttons_frame
-        button = ctk.CTkButton(parent, text=text, command=command,
-                               font=DEFAULT_FONT_STYLE, corner_radius=12)
-        if style_options: button.configure(**style_options)
-        button.grid(row=row, column=col, sticky="nsew", padx=4, pady=4)
-
-    def _show_history_window(self):
-        if self.history_window_open: return
-        
-        history_win = ctk.CTkToplevel(self.window)
-        history_win.title("Hesaplama Geçmişi")
-        history_win.geometry("300x400")
-        history_win.resizable(False, False)
-
-        def on_close():
-            self.history_window_open = False
-            history_win.destroy()
-        
-        history_win.protocol("WM_DELETE_WINDOW", on_close)
-        self.history_window_open = True
-        
-        scroll_frame = ctk.CTkScrollableFrame(history_win, label_text="Geçmiş İşlemler")
-        scroll_frame.pack(expand=True, fill="both", padx=10, pady=10)
-        
-        if not self.logic.history:
-            ctk.CTkLabel(scroll_frame, text="Henüz bir işlem yapılmadı.", font=HISTORY_FONT_STYLE).pack(pady=10)
-        else:
-            for item in reversed(self.logic.history):
-                ctk.CTkLabel(scroll_frame, text=item, font=HISTORY_FONT_STYLE, anchor="w").pack(fill="x", padx=10, pady=5)
-
-    def _create_all_buttons(self):
-        # define button styles
-        digit_options = {"fg_color": FENER_BEYAZ, "text_color": FENER_LACIVERT, "font": DIGITS_FONT_STYLE, "hover_color": "#EAEAEA"}
-        op_options = {"fg_color": FENER_SARI, "text_color": FENER_LACIVERT, "font": ("Arial", 20, "bold"), "hover_color": "#FFE082"}
-        sci_options = {"fg_color": ADVANCED_OP_COLOR, "text_color": WHITE, "hover_color": "#2ECC71"}
-        del_options = {"fg_color": DEL_COLOR, "text_color": WHITE, "hover_color": "#D60000"}
-
-        # digits, decimal and sign toggle buttons
-        digits = {
-            7: (1, 0), 8: (1, 1), 9: (1, 2),
-            4: (2, 0), 5: (2, 1), 6: (2, 2),
-            1: (3, 0), 2: (3, 1), 3: (3, 2),
-            0: (4, 0), '.': (4, 1)
-        }
-        for digit, pos in digits.items(): self._create_button(str(digit), self._make_command(self.logic.add_to_expression, digit), pos[0], pos[1], digit_options)
-        self._create_button("+/-", self._make_command(self.logic.toggle_sign), 4, 2, digit_options)
-        
-        # operator buttons
-        self._create_button(self._get_op_symbol("/"), self._make_command(self.logic.append_operator, "/"), 0, 3, op_options)
-        self._create_button(self._get_op_symbol("*"), self._make_command(self.logic.append_operator, "*"), 1, 3, op_options)
-        self._create_button(self._get_op_symbol("-"), self._make_command(self.logic.append_operator, "-"), 2, 3, op_options)
-        self._create_button(self._get_op_symbol("+"), self._make_command(self.logic.append_operator, "+"), 3, 3, op_options)
-        self._create_button("=", self._make_command(self.logic.evaluate), 4, 3, op_options)
-
-        # delete and clear buttons
-        self._create_button("DEL", self._make_command(self.logic.delete_last), 0, 4, del_options)
-        self._create_button("AC", self._make_command(self.logic.clear), 0, 5, del_options)
-
-        # scientific buttons
-        self._create_button("sin", self._make_command(self.logic.trigo_sin), 0, 0, sci_options)
-        self._create_button("cos", self._make_command(self.logic.trigo_cos), 0, 1, sci_options)
-        self._create_button("tan", self._make_command(self.logic.trigo_tan), 0, 2, sci_options)
-
-        self._create_button("log", self._make_command(self.logic.calculate_log), 1, 4, sci_options)
-        self._create_button("ln", self._make_command(self.logic.calculate_ln), 1, 5, sci_options)
-
-        self._create_button("(", self._make_command(self.logic.append_operator, "("), 2, 4, sci_options)
-        self._create_button(")", self._make_command(self.logic.append_operator, ")"), 2, 5, sci_options)
-        self._create_button("xʸ", self._make_command(self.logic.append_operator, "**"), 3, 4, sci_options)
-        self._create_button("√x", self._make_command(self.logic.calculate_sqrt), 3, 5, sci_options)
-        self._create_button("x!", self._make_command(self.logic.calculate_factorial), 4, 4, sci_options)
-        self._create_button("%", self._make_command(self.logic.append_operator, "%"), 4, 5, sci_options)        
-
-        # history button
-        history_button = ctk.CTkButton(
-            self.container_frame,
-            text="⎋",
-            command=self._show_history_window,
-            fg_color="#DDE2E5",
-            hover_color="#E4E7EB",
-            text_color=FENER_LACIVERT,
-            font=("Arial", 20, "bold"),
-            width=50,
-            height=50,
-            corner_radius=0
-        )
-        history_button.place(relx=0.95, rely=0.02, anchor="ne")
-
-        # BUNU BAŞARAMADIM
-        # subframe for brackets
-        # parent_frame = ctk.CTkFrame(self.buttons_frame, fg_color="transparent")
-        # parent_frame.grid(row=4, column=4, sticky="nsew", padx=4, pady=4)
-        # parent_frame.columnconfigure(0, weight=1)
-        # parent_frame.columnconfigure(1, weight=1)
-        # self._create_button("(", self._make_command(self.logic.append_operator, "("), 0, 0, sci_options, parent=parent_frame)
-        # self._create_button(")", self._make_command(self.logic.append_operator, ")"), 0, 1, sci_options, parent=parent_frame)
-
-    def _bind_keys(self):
-        self.window.bind("<Return>", lambda event: self._make_command(self.logic.evaluate)())
-        self.window.bind("<BackSpace>", lambda event: self._make_command(self.logic.clear)())
-        for key in "7894561230.": self.window.bind(key, lambda event, d=key: self._make_command(self.logic.add_to_expression, d)())
-        for key in "/*-+%": self.window.bind(key, lambda event, o=key: self._make_command(self.logic.append_operator, o)())
-        self.window.bind("!", lambda event: self._make_command(self.logic.calculate_factorial)())
-
-class CalculatorApp:
-    def __init__(self):
-        ctk.set_appearance_mode("Dark")
-        self.window = ctk.CTk()
-        self.window.geometry("500x800")
-        self.window.resizable(0, 0)
-        self.window.title("OOP Bilimsel Hesap Makinesi")
-        
-        self.logic = CalculationLogic()
-        
-        self.ui = CalculatorUI(self.window, self.logic)
-    
-    def run(self):
-        self.window.mainloop()
+            stats = run_pipeline(args.pipeline, args.output or "-", args.expression, args.chunk_size or DEFAULT_CHUNK_ROWS, angle=args.angle)
+        except ExpressionError as error:
+            parser.error(f"--expression: {error}")
+        print(stats, file=sys.stderr)
+        return
+
+    if args.replay:
+        from calc_trace import replay
+        report = replay(args.replay, CalculationLogic(args.backend, args.precision, angle_unit=args.angle), realtime=args.realtime)
+        print(report)
+        sys.exit(1 if report.diffs() else 0)
+
+    if args.batch is None:
+        from calc_ui import CalculatorApp  # pulls in customtkinter, GUI only
+        CalculatorApp(history_path=args.history, metrics_path=args.metrics, trace_path=args.record, angle_unit=args.angle,
+                      backend=args.backend, precision=args.precision).run()
+        return
+
+    source = sys.stdin if args.batch == "-" else open(args.batch, encoding="utf-8")
+    output = sys.stdout if args.output is None else open(args.output, "w", encoding="utf-8")
+    try:
+        run_batch(source, output, workers=args.workers or None, chunk_size=args.chunk_size,
+                  backend=args.backend, precision=args.precision, formula=args.formula, angle_unit=args.angle)
+    except ExpressionError as error:
+        # per-line errors are Hata in the output; only an invalid --formula ends up here
+        parser.error(f"--formula: {error}")
+    finally:
+        if source is not sys.stdin: source.close()
+        if output is not sys.stdout: output.close()
 
 if __name__ == "__main__":
-    app = CalculatorApp()
-    app.run()
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,904 @@
+import math
+import operator
+from functools import lru_cache
+
+# Tokenizer, Pratt parser and closure compiler for the expressions the UI builds.
+# Only numbers, names, + - * / // % ** and parentheses are accepted, so nothing arbitrary runs.
+
+DIGITS = "0123456789"
+OPERATOR_CHARS = "+-*/%()!@[],;"
+
+
+class ExpressionError(ValueError):
+    pass
+
+
+class TooExpensiveError(ExpressionError):
+    pass
+
+
+# Cost estimator: exact integer/rational results above this many bits are rejected before
+# they are computed (9**9**9 or 10000000! would otherwise hold the interpreter for minutes).
+MAX_RESULT_BITS = 1 << 20
+LN2 = math.log(2)
+# operators whose cost depends on operand size; everything else is effectively constant time
+EXPENSIVE_OPERATORS = frozenset(("**", "!", "factorial", "[", "@", "inv", "det", "solve"))
+
+
+def is_expensive(tokens, backend="float"):
+    # on the decimal backend a literal's exponent alone can make a huge result ("1e999999")
+    return any(token[1] in EXPENSIVE_OPERATORS or backend == "decimal" and token[0] == "num" and "e" in token[2].lower()
+               for token in tokens)
+
+
+def checked_pow(base, exponent):
+    # only exact powers grow without bound; int ** negative int is a float operation
+    if hasattr(base, "numerator") and getattr(exponent, "denominator", None) == 1 and (exponent > 0 or type(base) is not int):
+        bits = abs(exponent) * math.log2(max(abs(base.numerator), base.denominator, 1))
+        if bits > MAX_RESULT_BITS: raise TooExpensiveError(f"result would need about {bits:.0f} bits")
+    return base ** exponent
+
+
+MAX_FACTORIAL_ARGUMENT = 1e300  # lgamma overflows a float a little above this
+
+
+def factorial_value(x):
+    if x > MAX_FACTORIAL_ARGUMENT: raise OverflowError("factorial result out of range")
+    if x != int(x): return math.gamma(float(x) + 1)
+    if x < 0: raise ValueError("factorial is not defined for negative integers")
+    # past MAX_RESULT_BITS the exact value is out of reach; like the x! button, use lgamma
+    if x > 2 and math.lgamma(float(x) + 1) / LN2 > MAX_RESULT_BITS: return factorial_approximation(int(x))
+    return math.factorial(int(x))
+
+
+BINARY_OPS = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": operator.truediv,
+    "//": operator.floordiv,
+    "%": operator.mod,
+    "**": checked_pow,
+    "@": operator.matmul,
+}
+UNARY_OPS = {"-": operator.neg, "+": operator.pos}
+
+
+# Decimal's % and // truncate towards zero (-7 % 3 == -1); the other backends floor like float
+# (-7 % 3 == 2), so the decimal backend compiles these two operators to flooring versions.
+def floor_mod(x, y):
+    remainder = x % y
+    return remainder + y if remainder and (remainder < 0) != (y < 0) else remainder
+
+
+def floor_div(x, y):
+    quotient = x // y
+    return quotient - 1 if x % y and (x < 0) != (y < 0) else quotient
+
+
+BACKEND_OPS = {"decimal": {**BINARY_OPS, "%": floor_mod, "//": floor_div}}
+
+# same conventions as the scientific buttons: sin/cos/tan take degrees; the *_rad variants are
+# used in radian angle mode and for quantities tagged with an angle unit (see calc_units)
+FUNCTIONS = {
+    "sin": lambda x: math.sin(math.radians(x)),
+    "cos": lambda x: math.cos(math.radians(x)),
+    "tan": lambda x: math.tan(math.radians(x)),
+    "sin_rad": math.sin,
+    "cos_rad": math.cos,
+    "tan_rad": math.tan,
+    "log": math.log10,
+    "ln": math.log,
+    "sqrt": math.sqrt,
+    "factorial": factorial_value,
+}
+
+# (left binding power, right binding power); ** is right associative
+BINDING_POWER = {"+": (10, 11), "-": (10, 11), "*": (20, 21), "/": (20, 21), "//": (20, 21), "%": (20, 21), "@": (20, 21), "**": (40, 39)}
+PREFIX_POWER = 30
+POSTFIX_POWER = 50  # n! binds tighter than **, so 2**3! is 2**6
+
+
+def tokenize(text):
+    # hand-written scanner: keeps `re` out of the import path of the core
+    tokens, pos, end = [], 0, len(text)
+    while pos < end:
+        char = text[pos]
+        if char.isspace():
+            pos += 1
+        elif char in DIGITS or char == ".":
+            start = pos
+            while pos < end and text[pos] in DIGITS: pos += 1
+            if pos < end and text[pos] == ".":
+                pos += 1
+                while pos < end and text[pos] in DIGITS: pos += 1
+            if pos + 1 < end and text[pos] in "eE":
+                # exponent, as produced by the scientific display of huge results
+                digits_at = pos + 2 if text[pos + 1] in "+-" else pos + 1
+                if digits_at < end and text[digits_at] in DIGITS:
+                    pos = digits_at
+                    while pos < end and text[pos] in DIGITS: pos += 1
+            number = text[start:pos]
+            if number == ".": raise ExpressionError(f"unexpected character at {start}: '.'")
+            is_float = "." in number or "e" in number or "E" in number
+            tokens.append(("num", float(number) if is_float else int(number), number))
+        elif char.isalpha() or char == "_":
+            start = pos
+            while pos < end and (text[pos].isalnum() or text[pos] == "_"): pos += 1
+            tokens.append(("name", text[start:pos], text[start:pos]))
+        elif text.startswith("**", pos) or text.startswith("//", pos):
+            tokens.append(("op", text[pos:pos + 2], text[pos:pos + 2]))
+            pos += 2
+        elif char in OPERATOR_CHARS:
+            tokens.append(("op", char, char))
+            pos += 1
+        else:
+            raise ExpressionError(f"unexpected character at {pos}: {char!r}")
+    return tokens
+
+
+class Parser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos][:2] if self.pos < len(self.tokens) else (None, None)
+
+    def advance(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def parse(self):
+        if not self.tokens: raise ExpressionError("empty expression")
+        node = self.expression(0)
+        if self.pos != len(self.tokens):
+            raise ExpressionError(f"unexpected token {self.peek()[1]!r}")
+        return node
+
+    def expression(self, min_bp):
+        left = self.prefix()
+        while True:
+            kind, value = self.peek()
+            if kind == "name":
+                # "5 km", "(1+2) deg": a name right after an operand tags it with a unit
+                if POSTFIX_POWER < min_bp: break
+                self.advance()
+                left = ("unit", left, value)
+                continue
+            if kind != "op": break
+            if value == "!":
+                if POSTFIX_POWER < min_bp: break
+                self.advance()
+                left = ("call", "factorial", left)
+                continue
+            if value not in BINDING_POWER: break
+            left_bp, right_bp = BINDING_POWER[value]
+            if left_bp < min_bp: break
+            self.advance()
+            left = ("bin", value, left, self.expression(right_bp))
+        return left
+
+    def group(self):
+        node = self.expression(0)
+        if self.advance() != ("op", ")"): raise ExpressionError("missing ')'")
+        return node
+
+    def arguments(self):
+        # f(x) -> x, solve(A, b) -> ("args", A, b)
+        args = [self.expression(0)]
+        while self.peek() == ("op", ","):
+            self.advance()
+            args.append(self.expression(0))
+        if self.advance() != ("op", ")"): raise ExpressionError("missing ')'")
+        return args[0] if len(args) == 1 else ("args", *args)
+
+    def matrix(self):
+        # [1, 2, 3] is a vector, [1, 2; 3, 4] a 2x2 matrix: "," separates columns, ";" rows
+        rows, row = [], [self.expression(0)]
+        while True:
+            token = self.advance()
+            if token == ("op", ","):
+                row.append(self.expression(0))
+            elif token == ("op", ";"):
+                rows.append(tuple(row))
+                row = [self.expression(0)]
+            elif token == ("op", "]"):
+                rows.append(tuple(row))
+                break
+            else:
+                raise ExpressionError("missing ']'")
+        if len({len(row) for row in rows}) != 1: raise ExpressionError("matrix rows differ in length")
+        return ("matrix", tuple(rows))
+
+    def prefix(self):
+        kind, value = self.advance()
+        if kind == "num":
+            return ("num", value, self.tokens[self.pos - 1][2])
+        if kind == "name":
+            if self.peek() != ("op", "("): return ("var", value)
+            self.advance()
+            return ("call", value, self.arguments())
+        if value in UNARY_OPS:
+            return ("unary", value, self.expression(PREFIX_POWER))
+        if value == "(":
+            return self.group()
+        if value == "[":
+            return self.matrix()
+        raise ExpressionError("unexpected end of expression" if kind is None else f"unexpected token {value!r}")
+
+
+def parse(text):
+    return Parser(tokenize(text)).parse()
+
+
+# Numeric backends: (literal, coerce, functions). literal builds a constant from the token text at
+# compile time, coerce converts float results of math functions back into the backend type
+# (rounded to what a float actually carries, so sin(30) stays 0.5 instead of 0.49999999999999994).
+# Operators are the plain operator.* functions for every backend (decimal swaps in flooring % and
+# // at compile time), so there is no per-operation dispatch; decimal and fractions are only
+# imported when their backend is first used.
+# functions is the table calls compile against: "complex" swaps in cmath once, when the tree is
+# compiled, so the real backends never check for complex values.
+BACKENDS = ("float", "decimal", "fraction", "complex")
+
+
+@lru_cache(maxsize=None)
+def get_backend(name):
+    if name == "float":
+        return (lambda text, value: value), None, FUNCTIONS
+    if name == "decimal":
+        from decimal import Decimal
+        return (lambda text, value: Decimal(text)), (lambda x: x if type(x) in (int, Decimal) else Decimal(f"{x:.15g}")), _decimal_functions()
+    if name == "fraction":
+        from fractions import Fraction
+        return (lambda text, value: Fraction(text)), (lambda x: x if type(x) is int else Fraction(x).limit_denominator(10**12)), FUNCTIONS
+    if name == "complex":
+        return (lambda text, value: value), None, _complex_functions()
+    raise ValueError(f"unknown numeric backend {name!r}, expected one of {BACKENDS}")
+
+
+def _decimal_functions():
+    # sqrt, ln and log are Decimal's own, so they keep the precision in effect (localcontext)
+    # instead of a float's 15 digits; trigonometry and gamma still go through math
+    from decimal import Decimal
+
+    def sqrt(x):
+        x = Decimal(x)
+        if x < 0: raise ValueError("math domain error")
+        return x.sqrt()
+
+    def logarithm(method):
+        def call(x):
+            x = Decimal(x)
+            if x <= 0: raise ValueError("math domain error")
+            return getattr(x, method)()
+        return call
+    return {**FUNCTIONS, "sqrt": sqrt, "ln": logarithm("ln"), "log": logarithm("log10")}
+
+
+def _complex_functions():
+    # same names and degree convention as FUNCTIONS; sqrt(-4) is 2i and ln(-1) is pi*i.
+    # Results with no imaginary part come back as floats, so %, ! and comparisons keep working
+    # on real values (sqrt(9)! is 6, not a TypeError on (3+0j)).
+    import cmath
+    degree = math.pi / 180
+
+    def real(func):
+        def call(x):
+            z = func(x)
+            return z.real if z.imag == 0 else z
+        return call
+    return {
+        "sin": real(lambda x: cmath.sin(x * degree)),
+        "cos": real(lambda x: cmath.cos(x * degree)),
+        "tan": real(lambda x: cmath.tan(x * degree)),
+        "sin_rad": real(cmath.sin),
+        "cos_rad": real(cmath.cos),
+        "tan_rad": real(cmath.tan),
+        "log": real(cmath.log10),
+        "ln": real(cmath.log),
+        "sqrt": real(cmath.sqrt),
+        "factorial": factorial_value,
+    }
+
+
+def imaginary_unit(node, variables=()):
+    # complex backend: i -> 1j and 3i (parsed like a unit tag) -> 3*1j, unless i is a parameter
+    kind = node[0]
+    if kind == "var": return ("num", 1j, "1j") if node[1] == "i" and "i" not in variables else node
+    if kind == "unit" and node[2] == "i" and "i" not in variables:
+        return ("bin", "*", imaginary_unit(node[1], variables), ("num", 1j, "1j"))
+    if kind == "unit": return ("unit", imaginary_unit(node[1], variables), node[2])
+    if kind in ("unary", "call"): return (kind, node[1], imaginary_unit(node[2], variables))
+    if kind == "bin": return ("bin", node[1], imaginary_unit(node[2], variables), imaginary_unit(node[3], variables))
+    if kind == "args": return ("args", *(imaginary_unit(arg, variables) for arg in node[1:]))
+    return node
+
+
+# Up-front cost estimate for "=": the size of every exact (int/Fraction) intermediate result is
+# bounded from the operands' magnitudes alone, in log2 arithmetic, without computing anything.
+# Float, Decimal and complex arithmetic is constant time whatever the values, so only exact
+# results count, plus a decimal result's own exponent: Decimal("1E+999999") is computed at the
+# context precision but still has to be displayed. The UI evaluates inline what stays under
+# INLINE_RESULT_BITS (microseconds to a millisecond) and hands the rest to its worker process.
+INLINE_RESULT_BITS = 1 << 16
+UNBOUNDED = (math.inf, math.inf, math.inf, True)
+FLOAT_BITS = 64.0
+LOG2_10 = math.log2(10)
+
+
+def estimate_bits(tokens, backend="float"):
+    # -> bound on the bits of the largest exact intermediate result (or of a decimal result),
+    # math.inf for what cannot be bounded (names, units, matrices); a syntax error costs
+    # nothing, "=" just shows Hata
+    return _estimate_token_tuple(tuple(tokens), backend)
+
+
+@lru_cache(maxsize=1024)
+def _estimate_token_tuple(tokens, backend):
+    try:
+        node = Parser(tokens).parse()
+    except ExpressionError:
+        return 0
+    largest = [0.0]
+    magnitude = _magnitude(node, backend, get_backend(backend)[0], largest)[0]
+    # an unknown divisor leaves the bound infinite; Decimal's Emax caps such results anyway
+    if backend == "decimal" and magnitude < math.inf: largest[0] = max(largest[0], magnitude)
+    return largest[0]
+
+
+def _bits(value):
+    if not value: return -math.inf
+    # a Decimal literal can lie far beyond float range; bound it by its exponent
+    if hasattr(value, "adjusted") and abs(value.adjusted()) > 300: return (value.adjusted() + 1) * LOG2_10
+    return math.log2(abs(value))
+
+
+def _times(bits, count):
+    # bits * count, where no bits stay none however large count is
+    return 0.0 if bits <= 0 or count == 0 else bits * count
+
+
+def _magnitude(node, backend, literal, largest):
+    # -> (log2 bound of |value|, numerator bits, denominator bits, exact); exact values are
+    # ints, or Fractions on the fraction backend, and their size is tracked in largest
+    kind = node[0]
+    if kind == "num":
+        value = literal(node[2], node[1])
+        if not hasattr(value, "numerator"): return _bits(value), FLOAT_BITS, 0.0, False
+        return _bits(value), max(_bits(value.numerator), 0.0), _bits(value.denominator), True
+    if backend == "complex" and (node == ("var", "i") or kind == "unit" and node[2] == "i"):
+        return (0.0 if kind == "var" else _magnitude(node[1], backend, literal, largest)[0]), FLOAT_BITS, 0.0, False
+    if kind == "unary": return _magnitude(node[2], backend, literal, largest)
+    if kind == "call" and node[1] in FUNCTIONS:
+        magnitude = _magnitude(node[2], backend, literal, largest)[0]
+        if node[1] == "factorial":
+            # n! is exact; non-integers go through math.gamma and, on the fraction backend, coerce
+            n = 2 ** magnitude if magnitude < 64 else math.inf
+            magnitude = math.lgamma(n + 1) / LN2 if n < math.inf else math.inf
+            numerator = max(magnitude, FLOAT_BITS)  # gamma near its poles is large too
+            denominator = 40.0 if backend == "fraction" else 0.0
+            largest[0] = max(largest[0], numerator + 2 * denominator)
+            return magnitude, numerator + denominator, denominator, True
+        if node[1] in ("sin", "cos", "sin_rad", "cos_rad"): magnitude = 0.0
+        elif node[1] == "sqrt": magnitude /= 2
+        elif node[1] in ("log", "ln"): magnitude = math.log2(magnitude) if magnitude > 1 else 0.0
+        else: magnitude = FLOAT_BITS
+        # the fraction backend coerces float results back, with a denominator up to 10**12
+        if backend != "fraction": return magnitude, FLOAT_BITS, 0.0, False
+        largest[0] = max(largest[0], max(magnitude, 0.0) + 80)
+        return magnitude, max(magnitude, 0.0) + 40, 40.0, True
+    if kind != "bin" or node[1] == "@":
+        largest[0] = math.inf
+        return UNBOUNDED
+    op = node[1]
+    left, left_numerator, left_denominator, left_exact = _magnitude(node[2], backend, literal, largest)
+    right, right_numerator, right_denominator, right_exact = _magnitude(node[3], backend, literal, largest)
+    exact = left_exact and right_exact
+    if op == "**":
+        count = 2 ** right if right < 1024 else math.inf
+        if node[3][0] == "num" or count == 0:
+            magnitude = 0.0 if count == 0 else left * count
+            numerator, denominator = _times(left_numerator, count), _times(left_denominator, count)
+        else:
+            # the exponent may be negative: that inverts the base, swapping numerator and
+            # denominator (int ** -n is a float); a float's inverse has no bound here
+            magnitude = _times(max(left, left_denominator), count) if left_exact else math.inf
+            numerator = _times(max(left_numerator, left_denominator), count)
+            denominator = numerator if backend == "fraction" else 0.0
+    elif op in ("+", "-"):
+        magnitude = max(left, right) + 1
+        numerator = max(left_numerator + right_denominator, right_numerator + left_denominator) + 1
+        denominator = left_denominator + right_denominator
+    elif op == "*":
+        magnitude = left + right
+        numerator, denominator = left_numerator + right_numerator, left_denominator + right_denominator
+    elif op == "/":
+        # magnitudes are upper bounds, so dividing needs the divisor's denominator instead
+        magnitude = left + right_denominator if right_exact else math.inf
+        numerator, denominator = left_numerator + right_denominator, left_denominator + right_numerator
+        exact = exact and backend == "fraction"  # int / int is a float division
+    elif op == "%":
+        magnitude = right  # |a % b| < |b|, whatever the signs
+        numerator, denominator = right_numerator + left_denominator, left_denominator + right_denominator
+    else:  # //
+        magnitude = max(left + right_denominator, 0.0) + 1 if right_exact else math.inf  # floor adds up to 1
+        numerator, denominator = left_numerator + right_denominator + 1, 0.0
+    if not exact: return magnitude, FLOAT_BITS, 0.0, False
+    largest[0] = max(largest[0], numerator + denominator)
+    return magnitude, numerator, denominator, True
+
+
+# Optimizer: literals become backend constants, constant subtrees are folded, identities such
+# as x*1, x**1 and x+0 are dropped, and repeated subtrees are computed once per evaluation.
+# Folding is skipped for decimal, whose results depend on the precision in effect at run time;
+# anything that fails to fold (1/0, 9**9**9, log(-1)) is left for run time to report.
+FOLDING_BACKENDS = ("float", "fraction", "complex")
+IDENTITIES = {"*": 1, "/": 1, "**": 1, "+": 0, "-": 0}  # x op identity == x
+
+
+def optimize(node, backend="float"):
+    literal, coerce, functions = get_backend(backend)
+    return _optimize(node, literal, coerce, backend in FOLDING_BACKENDS, functions)
+
+
+def _fold(node, compute):
+    try:
+        return ("const", compute())
+    except Exception:
+        return node
+
+
+def _is_const(node, value):
+    return node[0] == "const" and node[1] == value
+
+
+def _optimize(node, literal, coerce, fold, functions):
+    kind = node[0]
+    if kind == "num": return ("const", literal(node[2], node[1]))
+    if kind in ("var", "const"): return node
+    if kind in ("unary", "call"):
+        operand = _optimize(node[2], literal, coerce, fold, functions)
+        node = (kind, node[1], operand)
+        if not fold: return node
+        if kind == "unary":
+            if node[1] == "+": return operand
+            if operand[0] == "const": return _fold(node, lambda: UNARY_OPS[node[1]](operand[1]))
+        elif operand[0] == "const" and node[1] in functions:
+            func = functions[node[1]]
+            return _fold(node, lambda: func(operand[1]) if coerce is None else coerce(func(operand[1])))
+        return node
+    op = node[1]
+    left, right = _optimize(node[2], literal, coerce, fold, functions), _optimize(node[3], literal, coerce, fold, functions)
+    node = ("bin", op, left, right)
+    if not fold: return node
+    if left[0] == "const" and right[0] == "const": return _fold(node, lambda: BINARY_OPS[op](left[1], right[1]))
+    if (op == "*" or op == "+") and left[0] == "const": left, right = right, left  # 1*x, 0+x
+    if op in IDENTITIES and _is_const(right, IDENTITIES[op]): return left
+    return node
+
+
+def _count_subtrees(node, counts):
+    if node[0] in ("const", "var"): return
+    counts[node] = counts.get(node, 0) + 1
+    if counts[node] == 1:
+        for child in node[2:]: _count_subtrees(child, counts)
+
+
+def compile_tree(node, backend="float", variables=(), angle="deg"):
+    # returns evaluator(env): env maps variable names to values, None when there are none
+    if _has_matrices(node):
+        from calc_matrix import compile_matrix_tree  # NumPy, only for matrix expressions
+        return compile_matrix_tree(node, variables, angle)
+    if backend == "complex": node = imaginary_unit(node, variables)
+    if angle != "deg" or _has_units(node):
+        from calc_units import Quantity, resolve_units
+        node, unit = resolve_units(node, angle)
+        if unit is not None:
+            # SI result -> display unit, folded into the tree like any other constant
+            symbol, factor = unit
+            if factor != 1: node = ("bin", "/", node, ("num", factor, repr(factor)))
+            evaluator = compile_tree(node, backend, variables)
+            return lambda env: Quantity(evaluator(env), symbol)
+    node = optimize(node, backend)
+    counts = {}
+    _count_subtrees(node, counts)
+    slots = {subtree: i for i, subtree in enumerate(subtree for subtree, count in counts.items() if count > 1)}
+    _, coerce, functions = get_backend(backend)
+    root = compile_node(node, coerce, slots, frozenset(variables), {}, functions, BACKEND_OPS.get(backend, BINARY_OPS))
+    if not slots: return root
+    # shared values are memoized in a per-evaluation copy of env under their int slot number
+    return lambda env: root(dict(env) if env else {})
+
+
+MATRIX_FUNCTIONS = frozenset(("inv", "det", "solve", "transpose"))
+
+
+def _has_matrices(node):
+    kind = node[0]
+    if kind in ("matrix", "args"): return True
+    if kind == "unit": return _has_matrices(node[1])
+    if kind == "unary": return _has_matrices(node[2])
+    if kind == "call": return node[1] in MATRIX_FUNCTIONS or _has_matrices(node[2])
+    return kind == "bin" and (node[1] == "@" or _has_matrices(node[2]) or _has_matrices(node[3]))
+
+
+def _has_units(node):
+    kind = node[0]
+    if kind == "unit": return True
+    if kind in ("unary", "call"): return _has_units(node[2])
+    return kind == "bin" and (_has_units(node[2]) or _has_units(node[3]))
+
+
+def _shared(func, slot):
+    def shared(env):
+        try:
+            return env[slot]
+        except KeyError:
+            value = env[slot] = func(env)
+            return value
+    return shared
+
+
+def compile_node(node, coerce=None, slots=None, variables=frozenset(), compiled=None, functions=FUNCTIONS, ops=BINARY_OPS):
+    if compiled is not None and node in compiled: return compiled[node]
+    kind = node[0]
+    if kind == "const":
+        value = node[1]
+        func = lambda env: value
+    elif kind == "var":
+        if node[1] not in variables: raise ExpressionError(f"unknown name {node[1]!r}")
+        name = node[1]
+        func = lambda env: env[name]
+    elif kind == "unary":
+        op, operand = UNARY_OPS[node[1]], compile_node(node[2], coerce, slots, variables, compiled, functions, ops)
+        func = lambda env: op(operand(env))
+    elif kind == "call":
+        if node[1] not in functions: raise ExpressionError(f"unknown function {node[1]!r}")
+        call, operand = functions[node[1]], compile_node(node[2], coerce, slots, variables, compiled, functions, ops)
+        if coerce is None: func = lambda env: call(operand(env))
+        else: func = lambda env: coerce(call(operand(env)))
+    elif kind == "bin":
+        op = ops[node[1]]
+        left = compile_node(node[2], coerce, slots, variables, compiled, functions, ops)
+        right = compile_node(node[3], coerce, slots, variables, compiled, functions, ops)
+        func = lambda env: op(left(env), right(env))
+    else:
+        raise ExpressionError(f"cannot compile {kind!r} node")
+    if slots and node in slots: func = _shared(func, slots[node])
+    if compiled is not None: compiled[node] = func
+    return func
+
+
+def normalize(text):
+    return " ".join(text.split())
+
+
+# angle is the angle mode for plain numbers in sin/cos/tan: "deg" (the default) or "rad"
+@lru_cache(maxsize=4096)
+def _compile_normalized(text, backend, angle="deg"):
+    return compile_tree(parse(text), backend, angle=angle)
+
+
+def compile_expression(text, backend="float", angle="deg"):
+    return _compile_normalized(normalize(text), backend, angle)
+
+
+@lru_cache(maxsize=4096)
+def _compile_token_tuple(tokens, backend, angle="deg"):
+    return compile_tree(Parser(tokens).parse(), backend, angle=angle)
+
+
+def compile_tokens(tokens, backend="float", angle="deg"):
+    # for callers that tokenize incrementally (CalculationLogic); skips the scanner entirely
+    return _compile_token_tuple(tuple(tokens), backend, angle)
+
+
+def evaluate_tokens(tokens, backend="float", precision=None, angle="deg"):
+    return _run(compile_tokens(tokens, backend, angle), backend, precision)
+
+
+def evaluate_expression(text, backend="float", precision=None, angle="deg"):
+    return _run(compile_expression(text, backend, angle), backend, precision)
+
+
+def _run(evaluator, backend, precision):
+    if precision is None or backend != "decimal": return evaluator(None)
+    from decimal import localcontext
+    with localcontext(prec=precision):
+        return evaluator(None)
+
+
+# Formula templates: "f(x, y) = x**2 + sin(y)" is parsed and optimized once, then turned into
+# a real Python function (def f(x, y): return _pow(x, 2) + _coerce(_sin(y))) so a call costs
+# about as much as a hand-written one. The source only ever holds parameter names, generated
+# names for constants and engine functions, and operators, never text taken from the input.
+# Repeated subtrees are computed once through := . Arguments may be numbers (used as they are)
+# or expression strings such as "1/3", evaluated with the formula's backend.
+OPERATOR_NAMES = {"%": "_mod", "//": "_floordiv"}  # only bound for backends with their own versions
+
+
+def _function_source(node, namespace, shared, emitted, coerce, functions):
+    if node[0] == "var": return node[1]
+    if node[0] == "const":
+        name = f"_c{len(namespace)}"
+        namespace[name] = node[1]
+        return name
+    if node in emitted: return emitted[node]
+    kind = node[0]
+    if kind == "unary":
+        source = f"({node[1]}{_function_source(node[2], namespace, shared, emitted, coerce, functions)})"
+    elif kind == "call":
+        if node[1] not in functions: raise ExpressionError(f"unknown function {node[1]!r}")
+        namespace[f"_{node[1]}"] = functions[node[1]]
+        source = f"_{node[1]}({_function_source(node[2], namespace, shared, emitted, coerce, functions)})"
+        if coerce is not None: source = f"_coerce({source})"
+    else:
+        left = _function_source(node[2], namespace, shared, emitted, coerce, functions)
+        right = _function_source(node[3], namespace, shared, emitted, coerce, functions)
+        if node[1] == "**": source = f"_pow({left}, {right})"
+        elif node[1] in OPERATOR_NAMES and OPERATOR_NAMES[node[1]] in namespace: source = f"{OPERATOR_NAMES[node[1]]}({left}, {right})"
+        else: source = f"({left} {node[1]} {right})"
+    if node in shared:
+        emitted[node] = name = f"_s{len(emitted)}"
+        source = f"({name} := {source})"
+    return source
+
+
+def check_names(names, what="parameter"):
+    # names that become Python parameters; a leading underscore is reserved for the names
+    # compile_function generates (_c0, _s0, _pow), so "_c2" can't shadow a constant
+    from keyword import iskeyword
+    for name in names:
+        if not name.isidentifier() or iskeyword(name) or name.startswith("_") or name in FUNCTIONS:
+            raise ExpressionError(f"invalid {what} {name!r}")
+    if len(set(names)) != len(names): raise ExpressionError(f"duplicate {what}")
+
+
+def compile_function(node, parameters, backend="float", angle="deg"):
+    check_names(parameters)
+    if _has_units(node) or _has_matrices(node): raise ExpressionError("formulas take plain numbers, not units or matrices")
+    if backend == "complex": node = imaginary_unit(node, parameters)
+    if angle != "deg":
+        from calc_units import resolve_units
+        node = resolve_units(node, angle)[0]
+    node = optimize(node, backend)
+    counts = {}
+    _count_subtrees(node, counts)
+    _, coerce, functions = get_backend(backend)
+    namespace = {"_pow": checked_pow, "_coerce": coerce}
+    if backend in BACKEND_OPS: namespace.update((name, BACKEND_OPS[backend][op]) for op, name in OPERATOR_NAMES.items())
+    for name in expression_variables(node):
+        if name not in parameters: raise ExpressionError(f"unknown name {name!r}")
+    body = _function_source(node, namespace, {subtree for subtree, count in counts.items() if count > 1}, {}, coerce, functions)
+    exec(f"def formula({', '.join(parameters)}):\n    return {body}\n", namespace)
+    return namespace["formula"]
+
+
+def expression_variables(node):
+    if node[0] == "var": yield node[1]
+    elif node[0] in ("unary", "call"): yield from expression_variables(node[2])
+    elif node[0] == "bin":
+        yield from expression_variables(node[2])
+        yield from expression_variables(node[3])
+
+
+@lru_cache(maxsize=256)
+def _compile_formula(body, parameters, backend, angle):
+    return compile_function(parse(body), parameters, backend, angle)
+
+
+class Formula:
+    __slots__ = ("definition", "name", "parameters", "body", "backend", "precision", "angle", "function", "native")
+
+    def __init__(self, definition, backend="float", precision=None, angle="deg"):
+        head, equals, body = definition.partition("=")
+        name, paren, parameters = head.strip().partition("(")
+        name, parameters = name.strip(), parameters.strip()
+        if not equals or not paren or not parameters.endswith(")"):
+            raise ExpressionError(f"expected 'name(parameters) = expression', got {definition!r}")
+        parameters = tuple(p.strip() for p in parameters[:-1].split(",")) if parameters[:-1].strip() else ()
+        if not name.isidentifier() or name in FUNCTIONS: raise ExpressionError(f"invalid formula name {name!r}")
+        check_names(parameters)
+        self.definition, self.name, self.parameters, self.body = definition, name, parameters, normalize(body)
+        self.backend, self.precision, self.angle = backend, precision, angle
+        self.function = _compile_formula(self.body, parameters, backend, angle)
+        # argument types passed through as-is: float and complex take any number, the exact
+        # backends only int and their own type (a float 0.1 is read as the text "0.1")
+        self.native = None if backend in ("float", "complex") else (int, type(get_backend(backend)[0]("1", 1)))
+
+    def bind(self, args, bindings):
+        if len(args) > len(self.parameters): raise ExpressionError(f"{self.name}() takes {len(self.parameters)} arguments")
+        env = dict(zip(self.parameters, args))
+        env.update(bindings)
+        if len(env) != len(self.parameters) or any(parameter not in env for parameter in self.parameters):
+            raise ExpressionError(f"{self.name}() expects {', '.join(self.parameters)}")
+        return [env[p] if self._native((env[p],)) else evaluate_expression(str(env[p]), self.backend, self.precision, self.angle)
+                for p in self.parameters]
+
+    def _native(self, args):
+        if self.native is None: return str not in map(type, args)
+        return all(type(arg) in self.native for arg in args)
+
+    def __call__(self, *args, **bindings):
+        if bindings or len(args) != len(self.parameters) or not self._native(args): args = self.bind(args, bindings)
+        if self.precision is None or self.backend != "decimal": return self.function(*args)
+        from decimal import localcontext
+        with localcontext(prec=self.precision):
+            return self.function(*args)
+
+    def __repr__(self):
+        return f"Formula({self.definition!r})"
+
+
+# Integers longer than this are rendered as "d.dddddde+N" from their leading bits instead of
+# paying for a full (quadratic) str() conversion; the display only shows 11 characters anyway.
+BIG_INT_DIGITS = 1000
+BIG_INT_BITS = int(BIG_INT_DIGITS / math.log10(2))
+SCIENTIFIC_DIGITS = 7
+EXACT_FACTORIAL_LIMIT = 3000
+LN10 = math.log(10)
+
+
+def format_scientific(log10_value, negative=False):
+    exponent = math.floor(log10_value)
+    mantissa = f"{10 ** (log10_value - exponent):.{SCIENTIFIC_DIGITS - 1}f}"
+    if mantissa.startswith("10"):
+        exponent += 1
+        mantissa = f"{1:.{SCIENTIFIC_DIGITS - 1}f}"
+    return f"{'-' if negative else ''}{mantissa}e{exponent:+d}"
+
+
+def _log10_int(magnitude):
+    # log10 of a positive int from its leading 64 bits
+    shift = max(magnitude.bit_length() - 64, 0)
+    return math.log10(magnitude >> shift) + shift * math.log10(2)
+
+
+def _format_int(result):
+    if result.bit_length() <= BIG_INT_BITS: return result
+    return format_scientific(_log10_int(abs(result)), result < 0)
+
+
+def factorial_approximation(n):
+    # n! from the Stirling-accurate log-gamma, constant time for any n; a Decimal, so it keeps
+    # an exponent no float can hold and displays like any other huge result
+    from decimal import Decimal
+    log10_value = math.lgamma(n + 1) / LN10
+    exponent = math.floor(log10_value)
+    return Decimal(f"{10 ** (log10_value - exponent):.15f}e{exponent}")
+
+
+def factorial_text(x):
+    if x > MAX_FACTORIAL_ARGUMENT: raise OverflowError("factorial result out of range")
+    if x != int(x): return str(format_result(math.gamma(x + 1)))  # non-integers use the gamma function
+    n = int(x)
+    if n < 0: raise ValueError("factorial is not defined for negative integers")
+    if n <= EXACT_FACTORIAL_LIMIT: return str(format_result(math.factorial(n)))
+    return str(format_result(factorial_approximation(n)))
+
+
+UNARY_CACHE_SIZE = 2048
+
+
+@lru_cache(maxsize=UNARY_CACHE_SIZE)
+def unary_text(name, value, backend="float", precision=None):
+    # Display text of a scientific button applied to `value`; replayed sessions and batch jobs
+    # repeat the same inputs (common angles, small factorials), so this is memoized.
+    try:
+        if precision is None or backend != "decimal": return _unary_text(name, value, backend)
+        from decimal import localcontext
+        with localcontext(prec=precision):
+            return _unary_text(name, value, backend)
+    except (ValueError, TypeError, ArithmeticError):
+        return "Hata"
+
+
+def _unary_text(name, value, backend):
+    if name == "factorial":
+        # checked before int(), which takes seconds on a Decimal such as 1E+999999
+        if value > MAX_FACTORIAL_ARGUMENT: raise OverflowError("factorial result out of range")
+        if backend == "float" or value == int(value): return factorial_text(value)
+    _, coerce, functions = get_backend(backend)
+    if backend == "complex": return str(format_complex(functions[name](value)))
+    # the exact backends give the same digits as sqrt(2) typed into "="
+    return str(format_result(functions[name](value) if coerce is None else coerce(functions[name](value))))
+
+
+def unary_cache_info():
+    return unary_text.cache_info()
+
+
+def _format_fraction(result):
+    if result.denominator == 1: return _format_int(result.numerator)
+    numerator, denominator = result.numerator, result.denominator
+    if max(numerator.bit_length(), denominator.bit_length()) > BIG_INT_BITS:
+        # (1/3)**10000: str() of either part would be quadratic, and past 4300 digits refused
+        return format_scientific(_log10_int(abs(numerator)) - _log10_int(denominator), numerator < 0)
+    return f"{numerator}/{denominator}"
+
+
+def _format_decimal(result):
+    if result.is_finite() and result and abs(result.adjusted()) >= BIG_INT_DIGITS:
+        # from the exponent and leading digits: int(Decimal("1E+999999")) alone takes ~40 s, and
+        # 1E-999999 in fixed point is a million characters
+        digits = result.as_tuple().digits[:17]
+        leading = int("".join(map(str, digits)))
+        return format_scientific(result.adjusted() + math.log10(leading) - (len(digits) - 1), result < 0)
+    if result == result.to_integral_value(): return _format_int(int(result))
+    # strip zeros by hand, normalize() would round to the default context precision
+    return format(result, "f").rstrip("0")
+
+
+# exact backends keep every digit, floats keep the calculator's historical 4 decimals
+MATRIX_PREVIEW_SIZE = 6  # larger arrays are shown as their shape, e.g. "300×300"
+
+
+def _format_array(result):
+    # NumPy results, without importing NumPy: "[1,2;3,4]" reads back as a matrix literal
+    if result.ndim == 0: return format_result(result.item())
+    if result.size > MATRIX_PREVIEW_SIZE: return "×".join(map(str, result.shape if result.ndim == 2 else (1, result.size)))
+    rows = result.tolist() if result.ndim == 2 else [result.tolist()]
+    return "[" + ";".join(",".join(str(format_result(value)) for value in row) for row in rows) + "]"
+
+
+def _format_quantity(result):
+    return f"{format_result(result.value)} {result.unit}"
+
+
+EXACT_FORMATTERS = {"Fraction": _format_fraction, "Decimal": _format_decimal, "Quantity": _format_quantity, "ndarray": _format_array}
+
+
+def format_result(result):
+    formatter = EXACT_FORMATTERS.get(type(result).__name__)
+    if formatter is not None: return formatter(result)
+    if type(result) is int: return _format_int(result)
+    return int(result) if result == int(result) else f"{result:.4f}"
+
+
+# Complex mode: results print as 3+4i (format_complex) or 5∠53.1301° (format_polar). Real
+# backends keep format_result, so there (-8)**0.5 stays Hata instead of turning complex.
+COMPLEX_NOISE = 1e-12  # parts this much smaller than the magnitude are rounding noise (cos(90))
+
+
+def format_complex(result):
+    # also used for history entries, which may come from either mode
+    if type(result) is not complex: return format_result(result)
+    real, imag, size = result.real, result.imag, abs(result)
+    if abs(imag) <= COMPLEX_NOISE * size: return format_result(real)
+    imag_text = "i" if abs(imag) == 1 else f"{format_result(abs(imag))}i"
+    if abs(real) <= COMPLEX_NOISE * size: return imag_text if imag > 0 else "-" + imag_text
+    return f"{format_result(real)}{'+' if imag > 0 else '-'}{imag_text}"
+
+
+def format_polar(result, angle="deg"):
+    import cmath
+    radius, phase = cmath.polar(complex(result))
+    if angle == "deg": return f"{format_result(radius)}∠{format_result(math.degrees(phase))}°"
+    return f"{format_result(radius)}∠{format_result(phase)}"
+
+
+def evaluate_text(text, backend="float", precision=None, angle="deg"):
+    formatter = format_complex if backend == "complex" else format_result
+    try:
+        return str(formatter(evaluate_expression(text, backend, precision, angle)))
+    except Exception:
+        return "Hata"
+
+
+# All compile and result caches are module level, so every CalculationLogic, launcher
+# (calc.py, erencalc.py, kardelencalc.py), service connection and thread in a process shares
+# one warm copy. functools.lru_cache keeps its bookkeeping consistent under threads; at worst
+# two threads compile the same text at once and one result is kept.
+def cache_info():
+    return _compile_normalized.cache_info()
+
+
+def cache_clear():
+    _compile_normalized.cache_clear()
+    _estimate_token_tuple.cache_clear()
+    _compile_token_tuple.cache_clear()
+    _compile_formula.cache_clear()
+    unary_text.cache_clear()
@@ -0,0 +1,221 @@
+import math
+import mmap
+import os
+import struct
+import time
+from array import array
+from collections import deque
+
+from calc_engine import format_complex
+
+# History backends for CalculationLogic. Both take add(expression, result) and read back like
+# a list of display strings (len, indexing, iteration), which is all the history window needs.
+
+HEADER = struct.Struct("<Id")
+OFFSET = struct.Struct("<Q")
+MAX_EXACT_FLOAT_INT = 2 ** 53
+
+
+def format_history_expression(expression):
+    return expression.replace("**", "^").replace("/", "÷").replace("*", "×")
+
+
+def format_history_entry(expression, result):
+    return f"{format_history_expression(expression)} = {format_complex(result)}"
+
+
+def check_index(i, count):
+    # list-style indexing: negative i counts from the end, anything else out of range raises
+    if i < 0: i += count
+    if not 0 <= i < count: raise IndexError("history index out of range")
+    return i
+
+
+class HistoryRecord:
+    __slots__ = ("expression", "result", "timestamp")
+
+    def __init__(self, expression, result, timestamp):
+        self.expression, self.result, self.timestamp = expression, result, timestamp
+
+    def __repr__(self):
+        return f"HistoryRecord({self.expression!r}, {self.result!r}, {self.timestamp!r})"
+
+    def __str__(self):
+        return format_history_entry(self.expression, self.result)
+
+
+class CompactHistory:
+    # Columnar in-memory history: per entry an expression id (uint32, expressions are interned),
+    # a float64 result and a float64 timestamp, i.e. 20 bytes instead of a formatted str.
+    # Results a float can't hold exactly (Fraction, Decimal, huge ints) are kept in a side dict.
+    # Display strings are only built when an entry is read, e.g. by the history window.
+
+    def __init__(self):
+        self.expressions = []
+        self._expression_ids = {}
+        self.expression_ids = array("I")
+        self.results = array("d")
+        self.timestamps = array("d")
+        self._exact = {}
+
+    def add(self, expression, result, timestamp=None):
+        expression_id = self._expression_ids.get(expression)
+        if expression_id is None:
+            expression_id = self._expression_ids[expression] = len(self.expressions)
+            self.expressions.append(expression)
+        kind = type(result)
+        if kind is not float and not (kind is int and -MAX_EXACT_FLOAT_INT <= result <= MAX_EXACT_FLOAT_INT):
+            self._exact[len(self.results)] = result
+        try:
+            value = float(result)
+        except (OverflowError, TypeError):
+            value = math.nan
+        self.expression_ids.append(expression_id)
+        self.results.append(value)
+        self.timestamps.append(time.time() if timestamp is None else timestamp)
+
+    def record(self, i):
+        i = check_index(i, len(self.results))
+        result = self._exact.get(i, self.results[i])
+        return HistoryRecord(self.expressions[self.expression_ids[i]], result, self.timestamps[i])
+
+    def where(self, predicate):
+        # numeric query over the result column, e.g. history.where(lambda r: r > 100)
+        return [self.record(i) for i, value in enumerate(self.results) if predicate(value)]
+
+    def __len__(self):
+        return len(self.results)
+
+    def __bool__(self):
+        return len(self.results) > 0
+
+    def __getitem__(self, i):
+        return str(self.record(i))
+
+    def __iter__(self):
+        for i in range(len(self.results)): yield self[i]
+
+    def __reversed__(self):
+        for i in range(len(self.results) - 1, -1, -1): yield self[i]
+
+
+class HistoryStore:
+    # Persistent, append-only history. Two files:
+    #   <path>      records: fixed-size header (payload length, timestamp) + UTF-8 payload
+    #   <path>.idx  one little-endian uint64 offset per record, so entry i is found in O(1)
+    # Reads of older entries go through mmap; only the newest `memory_window` entries are kept
+    # in RAM, and writes are fsync'ed in batches of `sync_every` records (and on close).
+    # The store behaves like CompactHistory (add, len, indexing, iteration) and also takes
+    # preformatted strings through append.
+
+    def __init__(self, path, memory_window=1000, sync_every=64):
+        self.path = path
+        self.sync_every = sync_every
+        self._data = open(path, "a+b")
+        self._index = open(path + ".idx", "a+b")
+        self._data_map = self._index_map = None
+        self._unsynced = 0
+        self._dirty = False
+
+        self._count = self._recover()
+        self._end = os.fstat(self._data.fileno()).st_size
+        self._recent = deque(maxlen=memory_window)
+        for i in range(max(self._count - memory_window, 0), self._count):
+            self._recent.append(self._read(i))
+
+    def _recover(self):
+        # drop a trailing index entry whose record never fully reached the data file
+        data_size = os.fstat(self._data.fileno()).st_size
+        count = os.fstat(self._index.fileno()).st_size // OFFSET.size
+        while count:
+            self._index.seek((count - 1) * OFFSET.size)
+            offset, = OFFSET.unpack(self._index.read(OFFSET.size))
+            if offset + HEADER.size <= data_size:
+                self._data.seek(offset)
+                length, _ = HEADER.unpack(self._data.read(HEADER.size))
+                if offset + HEADER.size + length <= data_size: break
+            count -= 1
+        self._index.truncate(count * OFFSET.size)
+        return count
+
+    def __len__(self):
+        return self._count
+
+    def __bool__(self):
+        return self._count > 0
+
+    def __iter__(self):
+        for i in range(self._count): yield self[i]
+
+    def __reversed__(self):
+        for i in range(self._count - 1, -1, -1): yield self[i]
+
+    def __getitem__(self, i):
+        i = check_index(i, self._count)
+        first_recent = self._count - len(self._recent)
+        if i >= first_recent: return self._recent[i - first_recent]
+        return self._read(i)
+
+    def append(self, entry, timestamp=None):
+        payload = entry.encode("utf-8")
+        self._index.write(OFFSET.pack(self._end))
+        self._data.write(HEADER.pack(len(payload), time.time() if timestamp is None else timestamp))
+        self._data.write(payload)
+        self._end += HEADER.size + len(payload)
+        self._count += 1
+        self._recent.append(entry)
+        self._dirty = True
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every: self.sync()
+
+    def add(self, expression, result, timestamp=None):
+        self.append(format_history_entry(expression, result), timestamp)
+
+    def timestamp(self, i):
+        i = check_index(i, self._count)
+        return HEADER.unpack_from(self._map_data(), self._offset(i))[1]
+
+    def sync(self):
+        self._flush()
+        os.fsync(self._data.fileno())
+        os.fsync(self._index.fileno())
+        self._unsynced = 0
+
+    def close(self):
+        self.sync()
+        for mapping in (self._data_map, self._index_map):
+            if mapping is not None: mapping.close()
+        self._data.close()
+        self._index.close()
+
+    def _flush(self):
+        if self._dirty:
+            self._data.flush()
+            self._index.flush()
+            self._dirty = False
+
+    def _read(self, i):
+        data = self._map_data()
+        offset = self._offset(i)
+        length, _ = HEADER.unpack_from(data, offset)
+        start = offset + HEADER.size
+        return data[start:start + length].decode("utf-8")
+
+    def _offset(self, i):
+        return OFFSET.unpack_from(self._map_index(), i * OFFSET.size)[0]
+
+    # mappings are (re)created lazily whenever the file has grown past the mapped size
+    def _map_data(self):
+        self._flush()
+        if self._data_map is None or len(self._data_map) < self._end:
+            if self._data_map is not None: self._data_map.close()
+            self._data_map = mmap.mmap(self._data.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._data_map
+
+    def _map_index(self):
+        self._flush()
+        size = self._count * OFFSET.size
+        if self._index_map is None or len(self._index_map) < size:
+            if self._index_map is not None: self._index_map.close()
+            self._index_map = mmap.mmap(self._index.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._index_map
@@ -0,0 +1,263 @@
+from calc_engine import (ExpressionError, Formula, get_backend, evaluate_expression, evaluate_tokens, evaluate_text,
+                         format_complex, format_polar, format_result, tokenize, unary_text)
+from calc_history import CompactHistory, format_history_expression
+from calc_units import Quantity, quantity_operand
+
+DISPLAY_SYMBOLS = {"/": " \u00F7 ", "*": " \u00D7 ", "**": " ^ ", "//": " \u00F7\u00F7 "}
+# "*" "*" and "/" "/" typed as two keys are a power and a floor division, as in the string-built
+# expressions the tokens replaced
+DOUBLED_OPERATORS = frozenset(("**", "//"))
+# engine functions behind the sin/cos/tan buttons per angle mode
+ANGLE_FUNCTIONS = {
+    "deg": {"sin": "sin", "cos": "cos", "tan": "tan"},
+    "rad": {"sin": "sin_rad", "cos": "cos_rad", "tan": "tan_rad"},
+}
+
+def tokenize_entry(text):
+    # anything the scanner rejects (it cannot come from the buttons) makes "=" report Hata
+    try:
+        return tokenize(text)
+    except ExpressionError:
+        return [("error", text, text)]
+
+def operand_tokens(text):
+    # the displayed number as an operand: results that print as several tokens ("1/3", "3+4i",
+    # "5.3 km") are grouped, so 1/3 followed by ** 2 squares the whole fraction
+    tokens = tokenize_entry(text)
+    if _is_compound(tokens): return [("op", "(", "("), *tokens, ("op", ")", ")")]
+    return tokens
+
+def _is_compound(tokens):
+    return any(token[0] == "op" for token in tokens[1:])
+
+def _number_parser(backend):
+    # the displayed number read back with the backend's own literal: Decimal keeps every digit
+    # and exponents like 1e400, Fraction reads results such as "1/3"
+    if backend == "float": return float
+    literal = get_backend(backend)[0]
+    return lambda text: literal(text, None)
+
+def _negated(text):
+    return text[1:] if text.startswith('-') else '-' + text
+
+def _parse_complex(text):
+    # displayed complex results ("3+4i", "-2i") are expressions; real ones stay int/float
+    return evaluate_expression(text, "complex")
+
+class CalculationLogic:
+    def __init__(self, backend="float", precision=None, history=None, angle_unit="deg"):
+        # total_expression is kept as engine tokens plus its rendered display text, both
+        # updated per keystroke, so neither the display nor "=" re-scans the whole string
+        self._tokens = []
+        self.total_display = ""
+        self.current_expression = ""
+        # CompactHistory by default; calc_history.HistoryStore for a persistent history
+        self.history = CompactHistory() if history is None else history
+        # named formula templates, compiled once by define_formula
+        self.formulas = {}
+        # complex results as "rect" (3+4i) or "polar" (5∠53.1301°); a polar result keeps its
+        # rectangular text here as (shown, operand), which the next operator or button uses,
+        # and so does a quantity whose derived unit the parser can't read back ("2.5 m/s")
+        self.angle_unit, self.complex_display = angle_unit, "rect"
+        self._result_operand = None
+        self.set_backend(backend, precision)
+        self.set_angle_unit(angle_unit)
+
+    @property
+    def total_expression(self):
+        return "".join(token[2] for token in self._tokens)
+
+    @total_expression.setter
+    def total_expression(self, text):
+        self._tokens, self.total_display = [], ""
+        for token in tokenize_entry(text) if text else (): self._push_token(token)
+
+    def _push_token(self, token):
+        self._tokens.append(token)
+        self.total_display += DISPLAY_SYMBOLS.get(token[2], token[2]) if token[0] == "op" else token[2]
+
+    def set_backend(self, backend, precision=None):
+        # "float" (fast), "decimal" (precision = significant digits), "fraction" (exact) or
+        # "complex" (cmath functions, i for the imaginary unit)
+        get_backend(backend)
+        self.backend, self.precision = backend, precision
+        self._recompile_formulas()
+        self._choose_dispatch()
+
+    def set_angle_unit(self, angle_unit):
+        # angle mode for plain numbers: "deg" or "rad"; tagged values ("30 deg") ignore it
+        self._trig = ANGLE_FUNCTIONS[angle_unit]
+        self.angle_unit = angle_unit
+        self._recompile_formulas()
+        self._choose_dispatch()
+
+    def set_complex_display(self, mode):
+        if mode not in ("rect", "polar"): raise ValueError(f"unknown complex display {mode!r}")
+        operand = self._operand_text()
+        self.complex_display = mode
+        self._choose_dispatch()
+        # a polar result switches to its rectangular form; typed input is left as it is
+        if mode == "rect" and operand != self.current_expression: self._show(operand)
+
+    def toggle_complex_display(self):
+        self.set_complex_display("polar" if self.complex_display == "rect" else "rect")
+
+    def _choose_dispatch(self):
+        # picked once per mode change, so the per-keystroke paths never test for complex values
+        self._polar = None
+        if self.backend != "complex":
+            self._format, self._parse_number, self._unary_backend = format_result, _number_parser(self.backend), self.backend
+            return
+        angle = self.angle_unit
+        if self.complex_display == "polar":
+            self._format = lambda result: format_polar(result, angle)
+            self._polar = lambda text: format_polar(_parse_complex(text), angle)
+        else: self._format = format_complex
+        self._parse_number, self._unary_backend = _parse_complex, "complex"
+
+    def _operand_text(self):
+        # the shown number as the next operand: a polar result stands for its rectangular text
+        if self._result_operand is not None and self._result_operand[0] == self.current_expression: return self._result_operand[1]
+        return self.current_expression
+
+    def _show(self, text):
+        # a result in rectangular text ("3+4i", "Hata"), shown in polar form in polar mode
+        if self._polar is None or text == "Hata":
+            self.current_expression, self._result_operand = text, None
+            return
+        try:
+            shown = self._polar(text)
+        except Exception:
+            shown = "Hata"
+        self.current_expression, self._result_operand = shown, (shown, text)
+
+    def _recompile_formulas(self):
+        for name, formula in self.formulas.items():
+            self.formulas[name] = Formula(formula.definition, self.backend, self.precision, self.angle_unit)
+
+    def add_to_expression(self, value):
+        self.current_expression += str(value)
+
+    def append_operator(self, operator):
+        if self.current_expression:
+            for token in operand_tokens(self._operand_text()): self._push_token(token)
+            self.current_expression = ""
+        elif self._tokens and self._tokens[-1][2] + operator in DOUBLED_OPERATORS:
+            operator = self._tokens.pop()[2] + operator
+            self.total_display = self.total_display[:-len(DISPLAY_SYMBOLS[operator[0]])]
+        self._push_token(("op", operator, operator))
+
+    def delete_last(self):
+        if self.current_expression:
+            self.current_expression = self.current_expression[:-1]
+
+    def clear(self):
+        self.current_expression, self.total_expression = "", ""
+
+    def format_result(self, result):
+        return self._format(result)
+
+    def evaluate(self):
+        tokens = self.pending_tokens()
+        if not tokens: return
+        try:
+            self.finish_evaluation(tokens, evaluate_tokens(tokens, self.backend, self.precision, self.angle_unit))
+        except Exception:
+            self.fail_evaluation()
+
+    # evaluate() in three steps, so the UI can run the middle one off the Tk thread
+    def pending_tokens(self):
+        return self._tokens + operand_tokens(self._operand_text()) if self.current_expression else self._tokens
+
+    def finish_evaluation(self, tokens, result):
+        formatted_result = self.format_result(result)
+        self.history.add("".join(token[2] for token in tokens), result)
+        self.current_expression = str(formatted_result)
+        if isinstance(result, Quantity):
+            value = str(self.format_result(result.value))
+            self._result_operand = (self.current_expression, quantity_operand(value, result.unit))
+        elif self._polar is not None: self._result_operand = (self.current_expression, str(format_complex(result)))
+        self.total_expression = ""
+
+    def fail_evaluation(self):
+        self.current_expression = "Hata"
+        self.total_expression = ""
+
+    def evaluate_many(self, expressions):
+        # stateless and lazy: one result per input line, history is left untouched
+        for expression in expressions:
+            expression = expression.strip()
+            yield evaluate_text(expression, self.backend, self.precision, self.angle_unit) if expression else ""
+
+    def define_formula(self, definition):
+        # "f(x, y) = x**2 + sin(y)"; redefining a name replaces the old formula
+        formula = Formula(definition, self.backend, self.precision, self.angle_unit)
+        self.formulas[formula.name] = formula
+        return formula
+
+    def evaluate_formula(self, name, *args, **bindings):
+        try:
+            return str(self._format(self.formulas[name](*args, **bindings)))
+        except Exception:
+            return "Hata"
+
+    def evaluate_formula_many(self, name, rows):
+        # rows of positional arguments (or dicts of bindings), one display result per row
+        formula = self.formulas[name]
+        for row in rows:
+            try:
+                yield str(self._format(formula(**row) if isinstance(row, dict) else formula(*row)))
+            except Exception:
+                yield "Hata"
+
+    def evaluate_matrix(self, expression, **arrays):
+        # NumPy arrays bound by name, e.g. evaluate_matrix("solve(A, b)", A=a, b=b); returns the
+        # raw result (ndarray or float), format_result gives the compact display text
+        from calc_matrix import evaluate_matrix
+        return evaluate_matrix(expression, self.angle_unit, **arrays)
+
+    def _current_number(self):
+        return self._parse_number(self._operand_text())
+
+    def toggle_sign(self):
+        if not self.current_expression: return
+        operand = self._operand_text()
+        if operand != self.current_expression and self._polar is None:
+            # a quantity with a derived unit: its display and operand text flip together
+            self.current_expression = _negated(self.current_expression)
+            self._result_operand = (self.current_expression, _negated(operand))
+            return
+        # a complex result ("3+4i", or the text behind a polar one) is negated as a whole; the
+        # "-" prefix below would only flip its real part
+        if operand != self.current_expression or self.backend == "complex" and _is_compound(tokenize_entry(operand)):
+            return self._show(str(format_complex(-_parse_complex(operand))))
+        self.current_expression = _negated(self.current_expression)
+
+    def _apply_unary(self, name):
+        # results are memoized on the parsed value in calc_engine.unary_text
+        if not self.current_expression: return
+        try:
+            value = self._current_number()
+        except (ValueError, ArithmeticError):
+            self.current_expression = "Hata"
+            return
+        self._show(unary_text(name, value, self._unary_backend, self.precision))
+
+    def calculate_sqrt(self): self._apply_unary("sqrt")
+
+    def calculate_factorial(self):
+        # n above EXACT_FACTORIAL_LIMIT is approximated via lgamma, so 100000! returns instantly
+        self._apply_unary("factorial")
+
+    def trigo_sin(self): self._apply_unary(self._trig["sin"])
+
+    def trigo_cos(self): self._apply_unary(self._trig["cos"])
+
+    def trigo_tan(self): self._apply_unary(self._trig["tan"])
+
+    def calculate_log(self): self._apply_unary("log")
+
+    def calculate_ln(self): self._apply_unary("ln")
+
+    def format_expression_for_history(self, expression):
+        return format_history_expression(expression)
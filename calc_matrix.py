@@ -0,0 +1,112 @@
+from functools import lru_cache
+
+from calc_engine import ExpressionError, normalize, parse
+from calc_vector import factorial, np, require_numpy
+
+# Vector and matrix expressions on NumPy (LAPACK/BLAS underneath):
+#   [1, 2, 3]                 vector          [1, 2; 3, 4]        2x2 matrix
+#   A @ B   matrix product    A * B, A + 1    element-wise, scalars broadcast
+#   inv(A), det(A), transpose(A), solve(A, b)
+#   sin, cos, tan, log, ln, sqrt, !           element-wise, following the angle mode
+# calc_engine.compile_tree hands every tree containing one of these here, so the scalar path
+# never imports NumPy. Constant literals are built once at compile time; a result that shares
+# memory with one of them (or with an input array) is copied before it is returned. The UI treats these
+# expressions as expensive (calc_engine.EXPENSIVE_OPERATORS), so they run in the worker process.
+
+MULTI_ARGUMENT_FUNCTIONS = {"solve": 2}  # every other function takes one argument
+BINARY_OPS = {"+": "add", "-": "subtract", "*": "multiply", "/": "true_divide", "//": "floor_divide", "%": "mod", "**": "power", "@": "matmul"}
+
+
+def _functions(angle):
+    def det(a):
+        return float(np.linalg.det(a))
+
+    sin, cos, tan = np.sin, np.cos, np.tan
+    if angle == "deg":
+        sin, cos, tan = (lambda x: np.sin(np.radians(x))), (lambda x: np.cos(np.radians(x))), (lambda x: np.tan(np.radians(x)))
+    return {
+        "sin": sin, "cos": cos, "tan": tan,
+        "sin_rad": np.sin, "cos_rad": np.cos, "tan_rad": np.tan,
+        "log": np.log10, "ln": np.log, "sqrt": np.sqrt, "factorial": factorial,
+        "inv": np.linalg.inv, "det": det, "transpose": np.transpose, "solve": np.linalg.solve,
+    }
+
+
+def compile_node(node, functions, variables, constants):
+    # constants collects the arrays built at compile time, which evaluations must not hand out
+    kind = node[0]
+    if kind == "num":
+        value = node[1]
+        return lambda env: value
+    if kind == "var":
+        if node[1] not in variables: raise ExpressionError(f"unknown name {node[1]!r}")
+        name = node[1]
+        return lambda env: env[name]
+    if kind == "matrix":
+        rows = [[compile_node(element, functions, variables, constants) for element in row] for row in node[1]]
+        if all(element[0] == "num" for row in node[1] for element in row):
+            matrix = _array([[element(None) for element in row] for row in rows])
+            constants.append(matrix)
+            return lambda env: matrix
+        return lambda env: _array([[element(env) for element in row] for row in rows])
+    if kind == "unary":
+        operand = compile_node(node[2], functions, variables, constants)
+        if node[1] == "+": return operand
+        return lambda env: np.negative(operand(env))
+    if kind == "call":
+        if node[1] not in functions: raise ExpressionError(f"unknown function {node[1]!r}")
+        func, args = functions[node[1]], node[2][1:] if node[2][0] == "args" else (node[2],)
+        # ufuncs take a second positional argument as their output array, so extra arguments
+        # would overwrite an input or a cached constant instead of failing
+        arity = MULTI_ARGUMENT_FUNCTIONS.get(node[1], 1)
+        if len(args) != arity: raise ExpressionError(f"{node[1]}() takes {arity} argument{'s' if arity > 1 else ''}")
+        if arity > 1:
+            operands = [compile_node(arg, functions, variables, constants) for arg in args]
+            return lambda env: func(*(operand(env) for operand in operands))
+        operand = compile_node(args[0], functions, variables, constants)
+        return lambda env: func(operand(env))
+    if kind == "bin":
+        func = getattr(np, BINARY_OPS[node[1]])
+        left = compile_node(node[2], functions, variables, constants)
+        right = compile_node(node[3], functions, variables, constants)
+        return lambda env: func(left(env), right(env))
+    raise ExpressionError(f"{kind!r} is not supported in matrix expressions")
+
+
+def _array(rows):
+    # a single row is a vector, [1; 2; 3] stays a 3x1 column
+    array = np.array(rows, dtype=np.float64)
+    return array[0] if len(rows) == 1 else array
+
+
+def _check(result):
+    # mirror the scalar engine: a NaN/inf anywhere (sqrt(-1), 1/0) makes the expression fail
+    if not np.all(np.isfinite(result)): raise ExpressionError("result is not finite")
+    return result
+
+
+def compile_matrix_tree(node, variables=(), angle="deg"):
+    require_numpy()
+    constants = []
+    root = compile_node(node, _functions(angle), frozenset(variables), constants)
+
+    def evaluate(env):
+        with np.errstate(all="ignore"):
+            result = _check(root(env))
+        # "[1, 2]", "+A" and "transpose(A)" return a constant, an input or a view of one
+        if isinstance(result, np.ndarray) and any(np.may_share_memory(result, array) for array in (*constants, *(env or {}).values())):
+            return result.copy()
+        return result
+    return evaluate
+
+
+@lru_cache(maxsize=256)
+def _compile_normalized(text, names, angle):
+    return compile_matrix_tree(parse(text), names, angle)
+
+
+def evaluate_matrix(text, angle="deg", **arrays):
+    # evaluate_matrix("solve(A, b)", A=a, b=b): named arrays for problems too big to type
+    names = tuple(sorted(arrays))
+    env = {name: np.asarray(value, dtype=np.float64) for name, value in arrays.items()}
+    return _compile_normalized(normalize(text), names, angle)(env)
@@ -0,0 +1,92 @@
+import json
+import math
+
+# Per-command latency histograms for the button/key commands (see CalculatorUI._make_command).
+# "logic" is the command itself; "display" is the frame flush that draws its result. Commands
+# between two flushes are drawn together, and the flush is counted once, under the last of them.
+# Histograms are HDR-style: values (nanoseconds) fall into log-linear buckets with 7
+# significant bits, so every recorded value costs O(1) and quantiles are within ~1.6%.
+
+SUB_BUCKET_BITS = 7
+HALF_SUB_BUCKETS = 1 << (SUB_BUCKET_BITS - 1)
+PHASES = ("logic", "display")
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = []
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value):
+        shift = max(value.bit_length() - SUB_BUCKET_BITS, 0)
+        index = shift * HALF_SUB_BUCKETS + (value >> shift)
+        if index >= len(self.counts): self.counts.extend([0] * (index + 1 - len(self.counts)))
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max: self.max = value
+
+    def percentile(self, percent):
+        if not self.count: return 0
+        target, seen = max(math.ceil(percent / 100 * self.count), 1), 0
+        for index, bucket in enumerate(self.counts):
+            seen += bucket
+            if seen >= target:
+                shift = max(index // HALF_SUB_BUCKETS - 1, 0)
+                # highest value that falls into this bucket, capped by what was actually seen
+                return min(((index - shift * HALF_SUB_BUCKETS + 1) << shift) - 1, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_us": self.total / self.count / 1000 if self.count else 0.0,
+            "p50_us": self.percentile(50) / 1000,
+            "p99_us": self.percentile(99) / 1000,
+            "max_us": self.max / 1000,
+        }
+
+
+class CommandMetrics:
+    def __init__(self):
+        self.histograms = {}
+
+    def _histograms(self, command):
+        histograms = self.histograms.get(command)
+        if histograms is None:
+            histograms = self.histograms[command] = (LatencyHistogram(), LatencyHistogram())
+        return histograms
+
+    def record(self, command, logic_ns, display_ns=None):
+        histograms = self._histograms(command)
+        histograms[0].record(logic_ns)
+        if display_ns is not None: histograms[1].record(display_ns)
+
+    def record_display(self, command, display_ns):
+        self._histograms(command)[1].record(display_ns)
+
+    def summary(self):
+        return {command: {phase: histogram.summary() for phase, histogram in zip(PHASES, histograms)}
+                for command, histograms in sorted(self.histograms.items())}
+
+    def to_json(self):
+        return json.dumps(self.summary(), indent=2)
+
+    def to_prometheus(self, metric="calc_command_latency_seconds"):
+        lines = [f"# HELP {metric} Latency of calculator commands split into logic and display update.",
+                 f"# TYPE {metric} summary"]
+        for command, histograms in sorted(self.histograms.items()):
+            for phase, histogram in zip(PHASES, histograms):
+                labels = f'command="{command}",phase="{phase}"'
+                for quantile in (0.5, 0.99):
+                    lines.append(f'{metric}{{{labels},quantile="{quantile}"}} {histogram.percentile(quantile * 100) / 1e9:.9f}')
+                lines.append(f"{metric}_sum{{{labels}}} {histogram.total / 1e9:.9f}")
+                lines.append(f"{metric}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def save(self, path):
+        # Prometheus text for *.prom, JSON otherwise
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus() if path.endswith(".prom") else self.to_json())
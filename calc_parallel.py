@@ -0,0 +1,41 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from calc_engine import evaluate_text
+
+# Evaluates a stream of expressions on a process pool. Workers only import calc_engine,
+# never customtkinter. At most `max_pending` chunks are in flight, so memory stays bounded,
+# and results are yielded in input order.
+
+DEFAULT_CHUNK_SIZE = 10000
+
+
+def _evaluate_chunk(lines, backend="float", precision=None, angle="deg"):
+    results = []
+    for line in lines:
+        line = line.strip()
+        results.append(evaluate_text(line, backend, precision, angle) if line else "")
+    return results
+
+
+def _chunks(lines, chunk_size):
+    lines = iter(lines)
+    while True:
+        chunk = list(islice(lines, chunk_size))
+        if not chunk: return
+        yield chunk
+
+
+def evaluate_parallel(lines, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, max_pending=None, backend="float", precision=None, angle="deg"):
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or workers * 2
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in _chunks(lines, chunk_size):
+            pending.append(executor.submit(_evaluate_chunk, chunk, backend, precision, angle))
+            if len(pending) >= max_pending:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
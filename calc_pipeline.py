@@ -0,0 +1,202 @@
+import csv
+import math
+import sys
+import time
+from itertools import islice
+
+from calc_engine import ExpressionError, check_names, compile_function, expression_variables, format_result, normalize, parse
+from calc_vector import np
+
+# Streams a CSV (or Parquet, with pyarrow) file through one calculator expression whose
+# variables are column names, e.g. "sqrt(x**2 + y**2)" or "n! / 2", and writes every input row
+# back out with the result appended. Rows are read, evaluated and written a chunk at a time,
+# so memory depends on chunk_rows, not on the file size.
+#   vectorized: the chunk's columns go through calc_vector as float64 arrays (needs numpy)
+#   per row:    the expression is compiled once with calc_engine.compile_function
+# Results follow the display conventions: formatted text, "Hata" for errors (NaN/null in Parquet).
+# The pipeline is float64 only (no --backend). Both modes produce float64 results: complex,
+# infinite and out-of-range values (171! and up) are errors, and both reject column names that
+# can't be parameters (keywords, a leading underscore), so a file gives the same output
+# whether or not numpy is installed.
+
+DEFAULT_CHUNK_ROWS = 65536
+
+
+class PipelineStats:
+    __slots__ = ("rows", "errors", "seconds")
+
+    def __init__(self):
+        self.rows = self.errors = 0
+        self.seconds = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return f"{self.rows} rows, {self.errors} errors in {self.seconds:.2f}s ({self.rows_per_second:,.0f} rows/s)"
+
+
+def _is_parquet(path):
+    return isinstance(path, str) and path.endswith(".parquet")
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError("Parquet files require pyarrow (pip install pyarrow)") from None
+
+
+def read_csv_chunks(source, chunk_rows=DEFAULT_CHUNK_ROWS):
+    # yields (header, columns) with columns as {name: list of str}; a header-only file is one
+    # empty chunk, so the columns are still checked and the header still written
+    reader = csv.reader(source)
+    header = next(reader, None)
+    if header is None: return
+    first = True
+    while True:
+        rows = list(islice(reader, chunk_rows))
+        if not rows and not first: return
+        yield header, {name: [row[i] if i < len(row) else "" for row in rows] for i, name in enumerate(header)}
+        first = False
+
+
+def read_parquet_chunks(path, chunk_rows=DEFAULT_CHUNK_ROWS):
+    _require_pyarrow()
+    import pyarrow.parquet as pq
+    parquet = pq.ParquetFile(path)
+    empty = True
+    for batch in parquet.iter_batches(batch_size=chunk_rows):
+        yield batch.schema.names, {name: batch.column(name).to_pylist() for name in batch.schema.names}
+        empty = False
+    if empty: yield parquet.schema_arrow.names, {name: [] for name in parquet.schema_arrow.names}
+
+
+def _float_column(values):
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        return np.array([_to_float(value) for value in values], dtype=np.float64)
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+class ColumnEvaluator:
+    def __init__(self, expression, vectorized=None, angle="deg"):
+        node = parse(normalize(expression))
+        self.expression = expression
+        self.names = tuple(dict.fromkeys(expression_variables(node)))
+        check_names(self.names, "column name")
+        self.vectorized = np is not None if vectorized is None else vectorized
+        if self.vectorized:
+            from calc_vector import compile_vectorized
+            self._vectorized = compile_vectorized(expression, angle)
+        else:
+            self._function = compile_function(node, self.names, angle=angle)
+
+    def check(self, header):
+        missing = [name for name in self.names if name not in header]
+        if missing: raise ExpressionError(f"expression uses unknown column(s): {', '.join(missing)}")
+
+    def evaluate(self, columns):
+        # one float per row; errors are NaN when vectorized and None per row
+        if self.vectorized:
+            return self._vectorized(**{name: _float_column(columns[name]) for name in self.names}).tolist()
+        function, results = self._function, []
+        for args in zip(*(columns[name] for name in self.names)) if self.names else [()] * _row_count(columns):
+            try:
+                # float() rejects complex results and ints beyond float64, like the NumPy path
+                value = float(function(*map(float, args)))
+            except Exception:
+                value = None
+            results.append(value if value is not None and math.isfinite(value) else None)
+        return results
+
+
+def _row_count(columns):
+    return len(next(iter(columns.values()))) if columns else 0
+
+
+def _display(value):
+    return "Hata" if value is None or value != value else str(format_result(value))
+
+
+def evaluate_chunks(chunks, expression, vectorized=None, stats=None, angle="deg"):
+    # generator: (header, columns, results) per chunk
+    evaluator, checked = ColumnEvaluator(expression, vectorized, angle), False
+    for header, columns in chunks:
+        if not checked:
+            evaluator.check(header)
+            checked = True
+        started = time.perf_counter()
+        results = evaluator.evaluate(columns)
+        if stats is not None:
+            stats.seconds += time.perf_counter() - started
+            stats.rows += len(results)
+            stats.errors += sum(1 for value in results if value is None or value != value)
+        yield header, columns, results
+
+
+def _parquet_value(value):
+    try:
+        return None if value is None or value != value else float(value)
+    except OverflowError:
+        return None
+
+
+def write_csv(chunks, output, result_column="result"):
+    writer, header_written = csv.writer(output, lineterminator="\n"), False
+    for header, columns, results in chunks:
+        if not header_written:
+            writer.writerow(list(header) + [result_column])
+            header_written = True
+        writer.writerows(zip(*(columns[name] for name in header), map(_display, results)))
+
+
+def write_parquet(chunks, path, result_column="result"):
+    _require_pyarrow()
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    writer = None
+    try:
+        for header, columns, results in chunks:
+            results = [_parquet_value(value) for value in results]
+            table = pa.table({**{name: columns[name] for name in header}, result_column: pa.array(results, pa.float64())})
+            if writer is None: writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None: writer.close()
+
+
+def run_pipeline(source, output, expression, chunk_rows=DEFAULT_CHUNK_ROWS, vectorized=None, result_column="result", angle="deg"):
+    # source/output are paths ("-" or file objects for CSV streams); returns PipelineStats,
+    # whose seconds cover evaluation only, so rows/s measures the calculator, not the disk
+    stats, opened = PipelineStats(), None
+    if _is_parquet(source):
+        chunks = read_parquet_chunks(source, chunk_rows)
+    elif source == "-":
+        chunks = read_csv_chunks(sys.stdin, chunk_rows)
+    elif isinstance(source, str):
+        opened = open(source, newline="", encoding="utf-8")
+        chunks = read_csv_chunks(opened, chunk_rows)
+    else:
+        chunks = read_csv_chunks(source, chunk_rows)
+    try:
+        evaluated = evaluate_chunks(chunks, expression, vectorized, stats, angle)
+        if _is_parquet(output):
+            write_parquet(evaluated, output, result_column)
+        elif output == "-":
+            write_csv(evaluated, sys.stdout, result_column)
+        elif isinstance(output, str):
+            with open(output, "w", newline="", encoding="utf-8") as f: write_csv(evaluated, f, result_column)
+        else:
+            write_csv(evaluated, output, result_column)
+    finally:
+        if opened is not None: opened.close()
+    return stats
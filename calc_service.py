@@ -0,0 +1,101 @@
+import asyncio
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from calc_engine import INLINE_RESULT_BITS, ExpressionError, estimate_bits, evaluate_text, is_expensive, tokenize
+
+# Local evaluation service speaking two line-delimited protocols on the same socket:
+#   plain:  "2+3\n"                                   -> "5\n"
+#   JSON:   {"id": 1, "expr": "2+3"}                  -> {"id": 1, "result": "5"}
+#           {"id": 2, "batch": ["1/0", "sqrt(16)"]}   -> {"id": 2, "results": ["Hata", "4"]}
+# Errors follow the calculator's "Hata" convention. Clients may pipeline: every line is
+# evaluated as soon as it arrives and answers are written back in request order. Expressions
+# the UI would hand to its worker (huge factorials, powers, decimal exponents) run on a process
+# pool so the loop never blocks.
+
+MAX_LINE = 16 * 1024 * 1024  # JSON batches arrive as one line
+MAX_PENDING = 1024  # per connection; the reader waits when this many answers are outstanding
+
+
+def is_slow(expression, backend="float"):
+    # the UI's test; text that doesn't tokenize is answered with Hata right away
+    try:
+        tokens = tokenize(expression)
+    except ExpressionError:
+        return False
+    return is_expensive(tokens, backend) and estimate_bits(tokens, backend) > INLINE_RESULT_BITS
+
+
+class EvaluationService:
+    def __init__(self, backend="float", precision=None, workers=None, angle="deg"):
+        self.backend, self.precision, self.angle = backend, precision, angle
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = None
+
+    async def evaluate(self, expression):
+        expression = expression.strip()
+        if not expression: return ""
+        if not is_slow(expression, self.backend): return evaluate_text(expression, self.backend, self.precision, self.angle)
+        if self._executor is None: self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, evaluate_text, expression, self.backend, self.precision, self.angle)
+
+    async def answer(self, line):
+        if not line.startswith("{"): return await self.evaluate(line)
+        try:
+            request = json.loads(line)
+            if "batch" in request:
+                results = await asyncio.gather(*(self.evaluate(str(expression)) for expression in request["batch"]))
+                response = {"id": request.get("id"), "results": list(results)}
+            else:
+                response = {"id": request.get("id"), "result": await self.evaluate(str(request["expr"]))}
+        except (ValueError, KeyError, TypeError, AttributeError) as error:
+            response = {"error": f"bad request: {error}"}
+        return json.dumps(response, ensure_ascii=False)
+
+    async def handle(self, reader, writer):
+        pending = asyncio.Queue(MAX_PENDING)
+
+        async def write_answers():
+            while True:
+                task = await pending.get()
+                if task is None: break
+                writer.write(f"{await task}\n".encode("utf-8"))
+                await writer.drain()
+
+        writer_task = asyncio.create_task(write_answers())
+        try:
+            try:
+                async for raw_line in reader:
+                    await pending.put(asyncio.create_task(self.answer(raw_line.decode("utf-8", "replace").rstrip("\r\n"))))
+            except ValueError:
+                # a line over the reader's limit: answer it after the queued ones, then hang up,
+                # since the rest of the stream can't be split back into requests
+                overrun = asyncio.get_running_loop().create_future()
+                overrun.set_result(json.dumps({"error": "bad request: line too long"}))
+                await pending.put(overrun)
+            await pending.put(None)
+            await writer_task
+        except ConnectionError:
+            writer_task.cancel()
+        finally:
+            writer.close()
+
+    def close(self):
+        if self._executor is not None: self._executor.shutdown(cancel_futures=True)
+
+
+async def serve(address="127.0.0.1:8765", backend="float", precision=None, workers=None, angle="deg"):
+    # address is "host:port" for TCP, anything containing a "/" for a Unix socket path
+    service = EvaluationService(backend, precision, workers, angle)
+    if "/" in address:
+        server = await asyncio.start_unix_server(service.handle, path=address, limit=MAX_LINE)
+    else:
+        host, _, port = address.rpartition(":")
+        server = await asyncio.start_server(service.handle, host or "127.0.0.1", int(port), limit=MAX_LINE)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
@@ -0,0 +1,181 @@
+import json
+import struct
+import time
+from time import perf_counter, perf_counter_ns
+
+from calc_metrics import LatencyHistogram
+
+# Session traces: every button/key command (CalculatorUI._make_command) as a compact binary
+# record, replayable headlessly against CalculationLogic for load tests and regression runs.
+# File layout: MAGIC, then events of
+#   EVENT header  microseconds since the previous event (uint32), command code (uint8),
+#                 argument length (uint16)
+#   payload       the command's arguments as UTF-8 text joined by ARG_SEPARATOR
+# A digit press is 8 bytes. The first event is SETTINGS, the backend, precision and angle mode
+# as JSON; on close the recorder appends a STATE event holding the final display state as
+# JSON, which replay compares against its own final state.
+
+MAGIC = b"CALCTRC1"
+EVENT = struct.Struct("<IBH")
+ARG_SEPARATOR = "\x1f"
+MAX_DELAY_US = 2 ** 32 - 1
+STATE = 255
+SETTINGS = 254
+# command codes are positions in this tuple, so new commands must only be appended
+COMMANDS = (
+    "add_to_expression", "append_operator", "evaluate", "clear", "delete_last", "toggle_sign",
+    "calculate_sqrt", "calculate_factorial", "trigo_sin", "trigo_cos", "trigo_tan",
+    "calculate_log", "calculate_ln", "toggle_complex_display",
+)
+COMMAND_CODES = {name: code for code, name in enumerate(COMMANDS)}
+
+
+def logic_settings(logic):
+    return {"backend": logic.backend, "precision": logic.precision, "angle_unit": logic.angle_unit}
+
+
+def logic_state(logic):
+    return {
+        "current_expression": logic.current_expression,
+        "total_expression": logic.total_expression,
+        "history_length": len(logic.history),
+        "last_history_entry": logic.history[-1] if logic.history else None,
+    }
+
+
+class TraceRecorder:
+    def __init__(self, path, logic=None):
+        self._file = open(path, "wb")
+        self._file.write(MAGIC)
+        if logic is not None: self._write(0, SETTINGS, json.dumps(logic_settings(logic)).encode("utf-8"))
+        self._last = perf_counter()
+
+    def record(self, name, args=()):
+        # UI-level commands (_evaluate, _clear) are stored under their logic names
+        code = COMMAND_CODES[name.lstrip("_")]
+        now = perf_counter()
+        delay = min(int((now - self._last) * 1e6), MAX_DELAY_US)
+        self._last = now
+        self._write(delay, code, ARG_SEPARATOR.join(str(arg) for arg in args).encode("utf-8"))
+
+    def _write(self, delay, code, payload):
+        self._file.write(EVENT.pack(delay, code, len(payload)))
+        self._file.write(payload)
+
+    def close(self, logic=None):
+        if logic is not None:
+            payload = json.dumps(logic_state(logic), ensure_ascii=False).encode("utf-8")
+            if len(payload) <= 0xFFFF: self._write(0, STATE, payload)
+        self._file.close()
+
+
+def read_trace(path):
+    # yields (delay_seconds, command, args); the SETTINGS and STATE events come through as
+    # ("settings", dict) and ("state", dict).
+    # A truncated last event (recorder killed mid-write) is ignored.
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC: raise ValueError(f"{path} is not a calculator trace")
+        while True:
+            header = f.read(EVENT.size)
+            if len(header) < EVENT.size: return
+            delay, code, length = EVENT.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length: return
+            if code == STATE:
+                yield 0.0, "state", json.loads(payload.decode("utf-8"))
+            elif code == SETTINGS:
+                yield 0.0, "settings", json.loads(payload.decode("utf-8"))
+            else:
+                text = payload.decode("utf-8")
+                yield delay / 1e6, COMMANDS[code], tuple(text.split(ARG_SEPARATOR)) if text else ()
+
+
+class ReplayReport:
+    def __init__(self):
+        self.events = 0
+        self.errors = 0  # commands that raised; Tk reports and skips these, so replay does too
+        self.seconds = 0.0
+        self.latencies = {}
+        self.recorded_state = None
+        self.final_state = None
+        self.recorded_settings = None  # None for traces written before settings were recorded
+        self.settings = None
+
+    @property
+    def throughput(self):
+        return self.events / self.seconds if self.seconds else 0.0
+
+    def diffs(self):
+        # [(field, recorded, replayed)] for every field of the final state that changed
+        if self.recorded_state is None: return []
+        return [(field, value, self.final_state.get(field)) for field, value in self.recorded_state.items()
+                if self.final_state.get(field) != value]
+
+    def settings_diffs(self):
+        # [(setting, recorded, replayed)]: a trace replayed in another mode can't match its state
+        if self.recorded_settings is None: return []
+        return [(name, value, self.settings.get(name)) for name, value in self.recorded_settings.items()
+                if self.settings.get(name) != value]
+
+    def summary(self):
+        return {
+            "events": self.events,
+            "errors": self.errors,
+            "seconds": self.seconds,
+            "events_per_second": self.throughput,
+            "commands": {name: histogram.summary() for name, histogram in sorted(self.latencies.items())},
+            "state_diffs": [{"field": field, "recorded": recorded, "replayed": replayed}
+                            for field, recorded, replayed in self.diffs()],
+            "settings_diffs": [{"setting": name, "recorded": recorded, "replayed": replayed}
+                               for name, recorded, replayed in self.settings_diffs()],
+        }
+
+    def __str__(self):
+        lines = [f"{self.events} commands in {self.seconds:.3f}s ({self.throughput:,.0f} commands/s), {self.errors} raised"]
+        for name, histogram in sorted(self.latencies.items()):
+            stats = histogram.summary()
+            lines.append(f"  {name:<20} n={stats['count']:<8} mean={stats['mean_us']:.2f}us "
+                         f"p50={stats['p50_us']:.2f}us p99={stats['p99_us']:.2f}us max={stats['max_us']:.2f}us")
+        lines.extend(f"recorded with {name} {recorded!r}, replayed with {replayed!r}" for name, recorded, replayed in self.settings_diffs())
+        if self.recorded_state is None:
+            lines.append("no recorded final state to compare")
+        else:
+            diffs = self.diffs()
+            lines.append("final state matches the recording" if not diffs else "final state differs:")
+            lines.extend(f"  {field}: recorded {recorded!r}, replayed {replayed!r}" for field, recorded, replayed in diffs)
+        return "\n".join(lines)
+
+
+def replay(path, logic=None, realtime=False):
+    # max speed by default; realtime=True sleeps so commands keep their recorded spacing.
+    # Expensive "=" run inline here (there is no worker process headlessly).
+    if logic is None:
+        from calc_logic import CalculationLogic
+        logic = CalculationLogic()
+    report, started = ReplayReport(), perf_counter()
+    due = started
+    for delay, name, args in read_trace(path):
+        if name == "state":
+            report.recorded_state = args
+            continue
+        if name == "settings":
+            report.recorded_settings = args
+            continue
+        if realtime:
+            due += delay
+            pause = due - perf_counter()
+            if pause > 0: time.sleep(pause)
+        command = getattr(logic, name)
+        start = perf_counter_ns()
+        try:
+            command(*args)
+        except Exception:
+            report.errors += 1
+        elapsed = perf_counter_ns() - start
+        histogram = report.latencies.get(name)
+        if histogram is None: histogram = report.latencies[name] = LatencyHistogram()
+        histogram.record(elapsed)
+        report.events += 1
+    report.seconds = perf_counter() - started
+    report.final_state, report.settings = logic_state(logic), logic_settings(logic)
+    return report
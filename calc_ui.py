@@ -0,0 +1,379 @@
+import customtkinter as ctk
+from time import monotonic, perf_counter_ns
+
+from calc_engine import INLINE_RESULT_BITS, estimate_bits, is_expensive
+from calc_logic import CalculationLogic
+
+LARGE_FONT_STYLE = ("Arial", 40, "bold")
+SMALL_FONT_STYLE = ("Arial", 16)
+DIGITS_FONT_STYLE = ("Arial", 24, "bold")
+DEFAULT_FONT_STYLE = ("Arial", 20)
+HISTORY_FONT_STYLE = ("Arial", 18)
+
+FENER_LACIVERT = "#001450"
+FENER_SARI = "#FBB100"
+FENER_BEYAZ = "#FFFFFF"
+DISPLAY_BG_COLOR = "#DDE2E5"
+ADVANCED_OP_COLOR = "#27AE60"
+DEL_COLOR = "#D60000"
+WHITE = "#FFFFFF"
+
+FRAME_MS = 16
+POLL_MS = 20
+EVALUATION_TIMEOUT = 5.0  # seconds before a background evaluation is cancelled
+COMPUTING_TEXT = "…"
+EVALUATION_COMMANDS = ("_evaluate", "_clear")  # the only commands taken while an evaluation runs
+
+class HistoryWindow:
+    # Virtualized history: a fixed pool of VISIBLE_ROWS labels is re-filled from the history
+    # list while scrolling, so opening and scrolling cost the same for 10 or 100000 entries.
+    VISIBLE_ROWS = 9
+
+    def __init__(self, window, history, on_close):
+        self.history = history
+        self.offset = 0  # rows scrolled away from the newest entry
+        self.seen = len(history)
+
+        self.toplevel = ctk.CTkToplevel(window)
+        self.toplevel.title("Hesaplama Geçmişi")
+        self.toplevel.geometry("300x400")
+        self.toplevel.resizable(False, False)
+        self.toplevel.protocol("WM_DELETE_WINDOW", on_close)
+
+        frame = ctk.CTkFrame(self.toplevel)
+        frame.pack(expand=True, fill="both", padx=10, pady=10)
+        ctk.CTkLabel(frame, text="Geçmiş İşlemler").pack(fill="x")
+        self.scrollbar = ctk.CTkScrollbar(frame, command=self._on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+        rows_frame = ctk.CTkFrame(frame, fg_color="transparent")
+        rows_frame.pack(side="left", expand=True, fill="both")
+
+        self.labels = [ctk.CTkLabel(rows_frame, text="", font=HISTORY_FONT_STYLE, anchor="w") for _ in range(self.VISIBLE_ROWS)]
+        for label in self.labels: label.pack(fill="x", padx=10, pady=5)
+        self.texts = [""] * self.VISIBLE_ROWS
+
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"): self.toplevel.bind(sequence, self._on_mousewheel)
+        self._render()
+
+    def destroy(self):
+        self.toplevel.destroy()
+
+    def refresh(self):
+        # new entries appear on top; a scrolled view keeps showing the same rows
+        added = len(self.history) - self.seen
+        if added and self.offset: self.offset += added
+        self.seen = len(self.history)
+        self._render()
+
+    def scroll_to(self, offset):
+        self.offset = max(0, min(offset, len(self.history) - self.VISIBLE_ROWS))
+        self._render()
+
+    def _render(self):
+        total = len(self.history)
+        if not total:
+            texts = ["Henüz bir işlem yapılmadı."] + [""] * (self.VISIBLE_ROWS - 1)
+        else:
+            texts = [self.history[total - 1 - i] if i < total else "" for i in range(self.offset, self.offset + self.VISIBLE_ROWS)]
+        for i, text in enumerate(texts):
+            if text != self.texts[i]:
+                self.labels[i].configure(text=text)
+                self.texts[i] = text
+        if total: self.scrollbar.set(self.offset / total, min(self.offset + self.VISIBLE_ROWS, total) / total)
+        else: self.scrollbar.set(0, 1)
+
+    def _on_scrollbar(self, action, amount, unit="units"):
+        if action == "moveto": self.scroll_to(int(float(amount) * len(self.history)))
+        else: self.scroll_to(self.offset + int(float(amount)) * (self.VISIBLE_ROWS if unit == "pages" else 1))
+
+    def _on_mousewheel(self, event):
+        up = event.num == 4 or getattr(event, "delta", 0) > 0
+        self.scroll_to(self.offset + (-1 if up else 1))
+
+class CalculatorUI:
+    def __init__(self, window, logic, metrics=None, recorder=None):
+        self._init_state(window, logic, metrics, recorder)
+
+        self.container_frame = ctk.CTkFrame(window, fg_color=FENER_LACIVERT, corner_radius=0)
+        self.container_frame.pack(expand=True, fill="both")
+
+        self.display_frame = self._create_display_frame()
+        self.buttons_frame = self._create_buttons_frame()
+
+        self.total_label, self.label = self._create_display_labels()
+        
+        for i in range(5): self.buttons_frame.rowconfigure(i, weight=1)
+        for i in range(6): self.buttons_frame.columnconfigure(i, weight=1)
+        
+        self._create_all_buttons()
+        self._bind_keys()
+        
+    def _init_state(self, window, logic, metrics=None, recorder=None):
+        # everything but the widgets, so benchmarks can drive the display logic without Tk
+        self.window = window
+        self.logic = logic
+        self.metrics = metrics  # calc_metrics.CommandMetrics, None = no instrumentation
+        self.recorder = recorder  # calc_trace.TraceRecorder, None = no session trace
+        self.history_window_open = False
+        self.history_window = None
+        self._display_pending = False
+        self._shown_text = self._shown_total = ""
+        self.redraw_count = 0
+        self.worker = None  # calc_worker.EvaluationWorker, started on the first expensive "="
+        self._evaluation = None
+        self._display_command = None  # with metrics: the command the next flush is timed for
+
+    def _create_display_frame(self):
+        frame = ctk.CTkFrame(self.container_frame, fg_color=DISPLAY_BG_COLOR, corner_radius=12)
+        frame.pack(expand=True, fill="both", pady=(0, 10))
+        frame.pack_propagate(False)
+        return frame
+
+    def _create_buttons_frame(self):
+        frame = ctk.CTkFrame(self.container_frame, fg_color="transparent")
+        frame.pack(expand=True, fill="both")
+        return frame
+
+    def _create_display_labels(self):
+        total_label = ctk.CTkLabel(self.display_frame, text="", anchor="e", text_color=FENER_LACIVERT, font=SMALL_FONT_STYLE)
+        total_label.pack(expand=True, fill='both', padx=24)
+        label = ctk.CTkLabel(self.display_frame, text="", anchor="e", text_color=FENER_LACIVERT, font=LARGE_FONT_STYLE)
+        label.pack(expand=True, fill='both', padx=24)
+        return total_label, label
+
+    def _update_display(self):
+        # mark dirty and flush at most once per frame, so pasted input or key-repeat bursts
+        # cost one redraw instead of one per character
+        if self._display_pending: return
+        self._display_pending = True
+        self.window.after(FRAME_MS, self._flush_display)
+
+    def _flush_display(self):
+        start = perf_counter_ns()
+        self._display_pending = False
+        text = COMPUTING_TEXT if self._evaluation else self.logic.current_expression[:11]
+        total = self.logic.total_display
+        if text != self._shown_text:
+            self.label.configure(text=text)
+            self._shown_text = text
+        if total != self._shown_total:
+            self.total_label.configure(text=total)
+            self._shown_total = total
+        self.redraw_count += 1
+        if self.history_window: self.history_window.refresh()
+        if self._display_command is not None:
+            self.metrics.record_display(self._display_command, perf_counter_ns() - start)
+            self._display_command = None
+
+    def _make_command(self, func, *args):
+        command = self._measured_command(func, args)
+        if self.recorder is not None:
+            trace, name, measured = self.recorder.record, func.__name__, command
+
+            def command():
+                trace(name, args)
+                measured()
+        if func.__name__ in EVALUATION_COMMANDS: return command
+        run = command
+
+        def idle_only():
+            # while "…" is shown the result would overwrite any input, so it is ignored (and not
+            # recorded); AC cancels the evaluation instead
+            if self._evaluation is None: run()
+        return idle_only
+
+    def _measured_command(self, func, args):
+        if self.metrics is None: return lambda: (func(*args), self._update_display())
+        # instrumented variant is chosen once per command, so the default path pays nothing.
+        # The redraw is timed by the next _flush_display; a "=" handed to the worker is timed
+        # by _poll_evaluation, from submission to result.
+        name, record = func.__name__, self.metrics.record
+
+        def command():
+            pending = self._evaluation
+            start = perf_counter_ns()
+            func(*args)
+            elapsed = perf_counter_ns() - start
+            if self._evaluation is None or self._evaluation is pending: record(name, elapsed)
+            self._display_command = name
+            self._update_display()
+        return command
+
+    def _evaluate(self):
+        # expressions are evaluated inline unless they hold ** or ! (or, in decimal mode, an
+        # exponent) and the size estimate can't keep them under INLINE_RESULT_BITS; those go to
+        # a worker process, polled from the Tk loop, with a timeout after which the worker is killed
+        if self._evaluation is not None: return
+        tokens = self.logic.pending_tokens()
+        if not is_expensive(tokens, self.logic.backend) or estimate_bits(tokens, self.logic.backend) <= INLINE_RESULT_BITS:
+            return self.logic.evaluate()
+        if self.worker is None:
+            from calc_worker import EvaluationWorker
+            self.worker = EvaluationWorker()
+        job = self.worker.submit(tokens, self.logic.backend, self.logic.precision, self.logic.angle_unit)
+        self._evaluation = (tokens, job, monotonic() + EVALUATION_TIMEOUT, perf_counter_ns())
+        self.window.after(POLL_MS, self._poll_evaluation)
+
+    def _poll_evaluation(self):
+        if self._evaluation is None: return
+        tokens, job, deadline, submitted = self._evaluation
+        if self.metrics is not None and (job.ready() or monotonic() >= deadline):
+            self.metrics.record(self._evaluate.__name__, perf_counter_ns() - submitted)
+            self._display_command = self._evaluate.__name__
+        if job.ready():
+            self._evaluation = None
+            try:
+                self.logic.finish_evaluation(tokens, job.get())
+            except Exception:
+                self.logic.fail_evaluation()
+        elif monotonic() < deadline:
+            self.window.after(POLL_MS, self._poll_evaluation)
+            return
+        else:
+            self._cancel_evaluation()
+            self.logic.fail_evaluation()
+        self._update_display()
+
+    def _cancel_evaluation(self):
+        if self._evaluation is None: return
+        self._evaluation = None
+        self.worker.cancel()
+
+    def _clear(self):
+        # AC also cancels a running evaluation
+        self._cancel_evaluation()
+        self.logic.clear()
+
+    def _get_op_symbol(self, op): return {"/": "\u00F7", "*": "\u00D7", "**": " ^ "}.get(op, op)
+
+    def _create_button(self, text, command, row, col, style_options=None, parent=None):
+        if parent is None: parent = self.buttons_frame
+        button = ctk.CTkButton(parent, text=text, command=command,
+                               font=DEFAULT_FONT_STYLE, corner_radius=12)
+        if style_options: button.configure(**style_options)
+        button.grid(row=row, column=col, sticky="nsew", padx=4, pady=4)
+
+    def _show_history_window(self):
+        if self.history_window_open: return
+
+        def on_close():
+            self.history_window_open = False
+            self.history_window.destroy()
+            self.history_window = None
+
+        self.history_window = HistoryWindow(self.window, self.logic.history, on_close)
+        self.history_window_open = True
+
+    def _create_all_buttons(self):
+        # define button styles
+        digit_options = {"fg_color": FENER_BEYAZ, "text_color": FENER_LACIVERT, "font": DIGITS_FONT_STYLE, "hover_color": "#EAEAEA"}
+        op_options = {"fg_color": FENER_SARI, "text_color": FENER_LACIVERT, "font": ("Arial", 20, "bold"), "hover_color": "#FFE082"}
+        sci_options = {"fg_color": ADVANCED_OP_COLOR, "text_color": WHITE, "hover_color": "#2ECC71"}
+        del_options = {"fg_color": DEL_COLOR, "text_color": WHITE, "hover_color": "#D60000"}
+
+        # digits, decimal and sign toggle buttons
+        digits = {
+            7: (1, 0), 8: (1, 1), 9: (1, 2),
+            4: (2, 0), 5: (2, 1), 6: (2, 2),
+            1: (3, 0), 2: (3, 1), 3: (3, 2),
+            0: (4, 0), '.': (4, 1)
+        }
+        for digit, pos in digits.items(): self._create_button(str(digit), self._make_command(self.logic.add_to_expression, digit), pos[0], pos[1], digit_options)
+        self._create_button("+/-", self._make_command(self.logic.toggle_sign), 4, 2, digit_options)
+        
+        # operator buttons
+        self._create_button(self._get_op_symbol("/"), self._make_command(self.logic.append_operator, "/"), 0, 3, op_options)
+        self._create_button(self._get_op_symbol("*"), self._make_command(self.logic.append_operator, "*"), 1, 3, op_options)
+        self._create_button(self._get_op_symbol("-"), self._make_command(self.logic.append_operator, "-"), 2, 3, op_options)
+        self._create_button(self._get_op_symbol("+"), self._make_command(self.logic.append_operator, "+"), 3, 3, op_options)
+        self._create_button("=", self._make_command(self._evaluate), 4, 3, op_options)
+
+        # delete and clear buttons
+        self._create_button("DEL", self._make_command(self.logic.delete_last), 0, 4, del_options)
+        self._create_button("AC", self._make_command(self._clear), 0, 5, del_options)
+
+        # scientific buttons
+        self._create_button("sin", self._make_command(self.logic.trigo_sin), 0, 0, sci_options)
+        self._create_button("cos", self._make_command(self.logic.trigo_cos), 0, 1, sci_options)
+        self._create_button("tan", self._make_command(self.logic.trigo_tan), 0, 2, sci_options)
+
+        self._create_button("log", self._make_command(self.logic.calculate_log), 1, 4, sci_options)
+        self._create_button("ln", self._make_command(self.logic.calculate_ln), 1, 5, sci_options)
+
+        self._create_button("(", self._make_command(self.logic.append_operator, "("), 2, 4, sci_options)
+        self._create_button(")", self._make_command(self.logic.append_operator, ")"), 2, 5, sci_options)
+        self._create_button("xʸ", self._make_command(self.logic.append_operator, "**"), 3, 4, sci_options)
+        self._create_button("√x", self._make_command(self.logic.calculate_sqrt), 3, 5, sci_options)
+        self._create_button("x!", self._make_command(self.logic.calculate_factorial), 4, 4, sci_options)
+        self._create_button("%", self._make_command(self.logic.append_operator, "%"), 4, 5, sci_options)        
+
+        # history button
+        history_button = ctk.CTkButton(
+            self.container_frame,
+            text="⎋",
+            command=self._show_history_window,
+            fg_color="#DDE2E5",
+            hover_color="#E4E7EB",
+            text_color=FENER_LACIVERT,
+            font=("Arial", 20, "bold"),
+            width=50,
+            height=50,
+            corner_radius=0
+        )
+        history_button.place(relx=0.95, rely=0.02, anchor="ne")
+
+        # BUNU BAŞARAMADIM
+        # subframe for brackets
+        # parent_frame = ctk.CTkFrame(self.buttons_frame, fg_color="transparent")
+        # parent_frame.grid(row=4, column=4, sticky="nsew", padx=4, pady=4)
+        # parent_frame.columnconfigure(0, weight=1)
+        # parent_frame.columnconfigure(1, weight=1)
+        # self._create_button("(", self._make_command(self.logic.append_operator, "("), 0, 0, sci_options, parent=parent_frame)
+        # self._create_button(")", self._make_command(self.logic.append_operator, ")"), 0, 1, sci_options, parent=parent_frame)
+
+    def _bind_keys(self):
+        self.window.bind("<Return>", lambda event: self._make_command(self._evaluate)())
+        self.window.bind("<BackSpace>", lambda event: self._make_command(self._clear)())
+        for key in "7894561230.": self.window.bind(key, lambda event, d=key: self._make_command(self.logic.add_to_expression, d)())
+        for key in "/*-+%": self.window.bind(key, lambda event, o=key: self._make_command(self.logic.append_operator, o)())
+        self.window.bind("!", lambda event: self._make_command(self.logic.calculate_factorial)())
+        # complex mode (--backend complex): i is the imaginary unit, p flips rectangular/polar
+        self.window.bind("i", lambda event: self._make_command(self.logic.add_to_expression, "i")())
+        self.window.bind("p", lambda event: self._make_command(self.logic.toggle_complex_display)())
+        # matrix literals and products: [1, 2; 3, 4] @ [5; 6]
+        for key, op in (("<bracketleft>", "["), ("<bracketright>", "]"), ("<comma>", ","), ("<semicolon>", ";"), ("<at>", "@")):
+            self.window.bind(key, lambda event, o=op: self._make_command(self.logic.append_operator, o)())
+
+class CalculatorApp:
+    def __init__(self, history_path=None, metrics_path=None, trace_path=None, angle_unit="deg", backend="float", precision=None):
+        ctk.set_appearance_mode("Dark")
+        self.window = ctk.CTk()
+        self.window.geometry("500x800")
+        self.window.resizable(0, 0)
+        self.window.title("OOP Bilimsel Hesap Makinesi")
+        
+        history = None
+        if history_path:
+            from calc_history import HistoryStore
+            history = HistoryStore(history_path)
+        self.logic = CalculationLogic(backend, precision, history=history, angle_unit=angle_unit)
+        
+        self.metrics_path = metrics_path
+        metrics = None
+        if metrics_path:
+            from calc_metrics import CommandMetrics
+            metrics = CommandMetrics()
+        recorder = None
+        if trace_path:
+            from calc_trace import TraceRecorder
+            recorder = TraceRecorder(trace_path, self.logic)
+        self.ui = CalculatorUI(self.window, self.logic, metrics, recorder)
+    
+    def run(self):
+        try:
+            self.window.mainloop()
+        finally:
+            if hasattr(self.logic.history, "close"): self.logic.history.close()
+            if self.ui.worker is not None: self.ui.worker.close()
+            if self.ui.metrics is not None: self.ui.metrics.save(self.metrics_path)
+            if self.ui.recorder is not None: self.ui.recorder.close(self.logic)
@@ -0,0 +1,165 @@
+import math
+
+from calc_engine import ExpressionError
+
+# Unit-aware expressions: "5 km + 300 m", "sin(30 deg)", "90 rad", "10 m / 4 s".
+# The parser turns "<operand> <name>" into ("unit", operand, name). resolve_units runs once per
+# compiled expression: it looks every unit up in UNIT_INDEX, checks dimensions (adding metres
+# to seconds is an ExpressionError before anything is evaluated) and rewrites the tree into a
+# plain one over SI values, so the compiled closures never see a unit and the conversion
+# factors are folded like any other constant. The result is shown in the unit of the first
+# operand ("5 km + 300 m" = 5.3 km), or in SI base units for products of two quantities.
+# Angles are a dimension of their own with radians as the SI unit; trigonometry on angles
+# uses the radian functions, on plain numbers it follows the calculator's angle mode.
+
+BASE_UNITS = ("m", "kg", "s", "rad")
+DIMENSIONLESS = (0, 0, 0, 0)
+LENGTH, MASS, TIME, ANGLE = (1, 0, 0, 0), (0, 1, 0, 0), (0, 0, 1, 0), (0, 0, 0, 1)
+PREFIXES = {"k": 1000, "c": 0.01, "m": 0.001, "u": 1e-06, "µ": 1e-06, "n": 1e-09}
+# symbol: (factor to the SI unit, dimension); SI units marked with a prefix flag get k, c, m, ...
+UNITS = {
+    "m": (1, LENGTH, True),
+    "in": (0.0254, LENGTH, False),
+    "ft": (0.3048, LENGTH, False),
+    "yd": (0.9144, LENGTH, False),
+    "mi": (1609.344, LENGTH, False),
+    "g": (0.001, MASS, True),
+    "t": (1000, MASS, False),
+    "lb": (0.45359237, MASS, False),
+    "s": (1, TIME, True),
+    "min": (60, TIME, False),
+    "h": (3600, TIME, False),
+    "day": (86400, TIME, False),
+    "rad": (1, ANGLE, False),
+    "deg": (math.pi / 180, ANGLE, False),
+}
+RADIAN_FUNCTIONS = {"sin": "sin_rad", "cos": "cos_rad", "tan": "tan_rad", "sin_rad": "sin_rad", "cos_rad": "cos_rad", "tan_rad": "tan_rad"}
+
+
+def _build_index():
+    # every accepted symbol, prefixed ones included, mapped to (factor, dimension) once at
+    # import; plain symbols win over prefixed spellings ("min" is minutes, not milli-inches)
+    index = {}
+    for symbol, (factor, dimension, prefixed) in UNITS.items():
+        if not prefixed: continue
+        for prefix, scale in PREFIXES.items():
+            value = scale * factor
+            index[prefix + symbol] = (int(value) if value == int(value) else value, dimension)
+    index.update((symbol, (factor, dimension)) for symbol, (factor, dimension, _) in UNITS.items())
+    return index
+
+
+UNIT_INDEX = _build_index()
+
+
+class Quantity:
+    __slots__ = ("value", "unit")
+
+    def __init__(self, value, unit):
+        self.value, self.unit = value, unit
+
+    def __float__(self):
+        return float(self.value)
+
+    def __eq__(self, other):
+        return isinstance(other, Quantity) and (self.value, self.unit) == (other.value, other.unit)
+
+    def __hash__(self):
+        return hash((self.value, self.unit))
+
+    def __repr__(self):
+        return f"Quantity({self.value!r}, {self.unit!r})"
+
+
+def dimension_name(dimension):
+    # SI spelling of a derived dimension, e.g. (1, 0, -2, 0) -> "m/s^2"
+    above = [symbol if power == 1 else f"{symbol}^{power}" for symbol, power in zip(BASE_UNITS, dimension) if power > 0]
+    below = [symbol if power == -1 else f"{symbol}^{-power}" for symbol, power in zip(BASE_UNITS, dimension) if power < 0]
+    return "*".join(above or ["1"]) + "".join("/" + symbol for symbol in below)
+
+
+def quantity_operand(text, unit):
+    # a shown quantity ("2.5000", "m/s^2") as text the parser reads back as the same quantity,
+    # "2.5000*(1 m)/(1 s)**2", so a derived result can be the next operand; "5.3 km" reads as is
+    if unit in UNIT_INDEX: return f"{text} {unit}"
+    numerator, *denominators = unit.split("/")
+    factors = [("*", factor) for factor in numerator.split("*") if factor != "1"] + [("/", factor) for factor in denominators]
+    operand = text
+    for op, factor in factors:
+        symbol, *powers = factor.split("^")
+        power = math.prod(map(int, powers))
+        operand += f"{op}(1 {symbol})" + ("" if power == 1 else f"**{power}")
+    return operand
+
+
+def _number(value):
+    return ("num", value, repr(value))
+
+
+def _scaled(node, factor):
+    return node if factor == 1 else ("bin", "*", node, _number(factor))
+
+
+def _add_dimensions(left, right, sign=1):
+    return tuple(a + sign * b for a, b in zip(left, right))
+
+
+def _constant(node):
+    # exponents of quantities must be plain numbers: 2, -1, 0.5
+    if node[0] == "num": return node[1]
+    if node[0] == "unary" and node[2][0] == "num": return -node[2][1] if node[1] == "-" else node[2][1]
+    raise ExpressionError("the exponent of a quantity must be a number")
+
+
+def resolve_units(node, angle="deg"):
+    # -> (plain node over SI values, display unit as (symbol, factor) or None)
+    node, dimension, unit = _resolve(node, angle)
+    if dimension == DIMENSIONLESS: return node, None
+    return node, unit or (dimension_name(dimension), 1)
+
+
+def _resolve(node, angle):
+    # -> (node, dimension, display unit or None)
+    kind = node[0]
+    if kind in ("num", "var", "const"): return node, DIMENSIONLESS, None
+    if kind == "unit":
+        entry = UNIT_INDEX.get(node[2])
+        if entry is None: raise ExpressionError(f"unknown unit {node[2]!r}")
+        operand, dimension, _ = _resolve(node[1], angle)
+        if dimension != DIMENSIONLESS: raise ExpressionError(f"{node[2]!r} applied to a quantity")
+        factor, dimension = entry
+        return _scaled(operand, factor), dimension, (node[2], factor)
+    if kind == "unary":
+        operand, dimension, unit = _resolve(node[2], angle)
+        return (kind, node[1], operand), dimension, unit
+    if kind == "call":
+        operand, dimension, unit = _resolve(node[2], angle)
+        name = node[1]
+        if name in RADIAN_FUNCTIONS:
+            if dimension not in (ANGLE, DIMENSIONLESS): raise ExpressionError(f"{name}() needs an angle")
+            if dimension == ANGLE or angle == "rad": name = RADIAN_FUNCTIONS[name]
+            return ("call", name, operand), DIMENSIONLESS, None
+        if name == "sqrt" and dimension != DIMENSIONLESS:
+            if any(power % 2 for power in dimension): raise ExpressionError("sqrt() of a unit with odd powers")
+            return ("call", name, operand), tuple(power // 2 for power in dimension), None
+        if dimension != DIMENSIONLESS: raise ExpressionError(f"{name}() needs a plain number")
+        return ("call", name, operand), DIMENSIONLESS, None
+    op = node[1]
+    left, left_dimension, left_unit = _resolve(node[2], angle)
+    right, right_dimension, right_unit = _resolve(node[3], angle)
+    if op in ("+", "-", "%"):
+        if left_dimension != right_dimension: raise ExpressionError(f"cannot combine {dimension_name(left_dimension)} and {dimension_name(right_dimension)} with {op}")
+        return ("bin", op, left, right), left_dimension, left_unit or right_unit
+    if op == "**":
+        if right_dimension != DIMENSIONLESS: raise ExpressionError("the exponent must be a plain number")
+        if left_dimension == DIMENSIONLESS: return ("bin", op, left, right), DIMENSIONLESS, None
+        exponent = _constant(node[3])
+        if exponent != int(exponent): raise ExpressionError("quantities can only be raised to whole powers")
+        exponent = int(exponent)
+        unit = (f"{left_unit[0]}^{exponent}", left_unit[1] ** exponent) if left_unit else None
+        return ("bin", op, left, right), tuple(power * exponent for power in left_dimension), unit
+    dimension = _add_dimensions(left_dimension, right_dimension, 1 if op == "*" else -1)
+    if right_dimension == DIMENSIONLESS: unit = left_unit
+    elif left_dimension == DIMENSIONLESS and op == "*": unit = right_unit
+    else: unit = None
+    return ("bin", op, left, right), dimension, unit
@@ -0,0 +1,109 @@
+import math
+from functools import lru_cache
+
+from calc_engine import format_result, normalize, parse, ExpressionError
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, only the vectorized mode needs it
+    np = None
+
+# Applies one expression to whole NumPy columns, e.g. evaluate_columns("x**2+3*x", x=values).
+# Domain errors (log of a negative, division by zero, ...) become NaN per element.
+
+
+def require_numpy():
+    if np is None:
+        raise ImportError("vectorized evaluation requires numpy (pip install numpy)")
+
+
+MAX_FLOAT_FACTORIAL = 170  # 171! overflows a float64
+
+
+@lru_cache(maxsize=None)
+def _factorial_table():
+    return np.array([float(math.factorial(n)) for n in range(MAX_FLOAT_FACTORIAL + 1)])
+
+
+def factorial(x):
+    # integers come from a table, anything else through gamma; negative integers and
+    # overflowing results are NaN like every other domain error here
+    x = np.asarray(x, dtype=np.float64)
+    whole = (x == np.floor(x)) & (x >= 0) & (x <= MAX_FLOAT_FACTORIAL)
+    result = np.where(whole, _factorial_table()[np.where(whole, x, 0).astype(np.intp)], np.nan)
+    partial = np.isfinite(x) & (x != np.floor(x))
+    if partial.any(): result[partial] = [math.gamma(v + 1) if v + 1 < 171.6 else math.nan for v in x[partial].tolist()]
+    return result
+
+
+def _functions(angle="deg"):
+    if angle == "rad":
+        trig = {"sin": np.sin, "cos": np.cos, "tan": np.tan}
+    else:
+        trig = {"sin": lambda x: np.sin(np.radians(x)), "cos": lambda x: np.cos(np.radians(x)), "tan": lambda x: np.tan(np.radians(x))}
+    return {
+        **trig,
+        "log": np.log10,
+        "ln": np.log,
+        "sqrt": np.sqrt,
+        "factorial": factorial,
+    }
+
+
+def _binary_ops():
+    return {"+": np.add, "-": np.subtract, "*": np.multiply, "/": np.true_divide, "//": np.floor_divide, "%": np.mod, "**": np.power}
+
+
+def compile_node(node, functions, binary_ops):
+    kind = node[0]
+    if kind == "num":
+        value = float(node[1])
+        return lambda env: value
+    if kind == "var":
+        name = node[1]
+        return lambda env: env[name]
+    if kind == "unary":
+        operand = compile_node(node[2], functions, binary_ops)
+        if node[1] == "+": return operand
+        return lambda env: np.negative(operand(env))
+    if kind == "call":
+        if node[1] not in functions: raise ExpressionError(f"unknown function {node[1]!r}")
+        func, operand = functions[node[1]], compile_node(node[2], functions, binary_ops)
+        return lambda env: func(operand(env))
+    if kind != "bin" or node[1] not in binary_ops:
+        raise ExpressionError("vectorized columns take plain numbers, not units or matrices")
+    func = binary_ops[node[1]]
+    left, right = compile_node(node[2], functions, binary_ops), compile_node(node[3], functions, binary_ops)
+    return lambda env: func(left(env), right(env))
+
+
+@lru_cache(maxsize=256)
+def _compile_normalized(text, angle):
+    return compile_node(parse(text), _functions(angle), _binary_ops())
+
+
+def compile_vectorized(text, angle="deg"):
+    # angle is the angle mode of sin/cos/tan, as in calc_engine: "deg" (the default) or "rad"
+    require_numpy()
+    evaluator = _compile_normalized(normalize(text), angle)
+
+    def run(**columns):
+        env = {name: np.asarray(values, dtype=np.float64) for name, values in columns.items()}
+        with np.errstate(all="ignore"):
+            result = np.asarray(evaluator(env), dtype=np.float64)
+        # Python's eval raises on inf/complex results, mirror that as NaN
+        return np.where(np.isfinite(result), result, np.nan)
+
+    return run
+
+
+def evaluate_columns(text, **columns):
+    return compile_vectorized(text)(**columns)
+
+
+def error_mask(results):
+    return np.isnan(results)
+
+
+def to_display(results):
+    return [("Hata" if value != value else str(format_result(value))) for value in results.tolist()]
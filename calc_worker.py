@@ -0,0 +1,24 @@
+import multiprocessing
+
+from calc_engine import evaluate_tokens
+
+# Runs evaluations in one spawned worker process so the Tk main loop keeps running.
+# A process (not a thread) is used because big-int arithmetic holds the GIL; cancel()
+# terminates it and the next submit() starts a fresh one.
+
+
+class EvaluationWorker:
+    def __init__(self):
+        self._pool = None
+
+    def submit(self, tokens, backend="float", precision=None, angle="deg"):
+        if self._pool is None: self._pool = multiprocessing.get_context("spawn").Pool(1)
+        return self._pool.apply_async(evaluate_tokens, (tokens, backend, precision, angle))
+
+    def cancel(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+
+    def close(self):
+        self.cancel()
@@ -0,0 +1,661 @@
+import asyncio
+import contextlib
+import io
+import json
+import math
+import os
+import random
+import re
+import tempfile
+import unittest
+import warnings
+from fractions import Fraction
+
+from calc import main, run_batch
+from calc_engine import (INLINE_RESULT_BITS, ExpressionError, TooExpensiveError, compile_tree, estimate_bits, evaluate_expression, evaluate_text,
+                         evaluate_tokens, is_expensive, optimize, parse, tokenize)
+from calc_history import CompactHistory, HistoryStore
+from calc_logic import CalculationLogic
+from calc_metrics import CommandMetrics, LatencyHistogram
+from calc_parallel import evaluate_parallel
+from calc_pipeline import run_pipeline
+from calc_service import EvaluationService, is_slow
+from calc_trace import TraceRecorder, replay
+from calc_units import quantity_operand
+from calc_vector import np
+
+try:
+    import calc_ui
+except ImportError:  # customtkinter is only needed for the window
+    calc_ui = None
+
+# Run from the repository root: python -m pytest tests (or python -m unittest discover tests)
+
+
+class BaselineLogic:
+    # the original eval() implementation of the display keys, as the reference for key sequences
+    def __init__(self):
+        self.total_expression = self.current_expression = ""
+        self.history = []
+
+    def add_to_expression(self, value):
+        self.current_expression += str(value)
+
+    def append_operator(self, operator):
+        if self.current_expression:
+            self.total_expression += self.current_expression
+            self.current_expression = ""
+        self.total_expression += operator
+
+    def delete_last(self):
+        if self.current_expression: self.current_expression = self.current_expression[:-1]
+
+    def clear(self):
+        self.current_expression, self.total_expression = "", ""
+
+    def evaluate(self):
+        full_expression = self.total_expression + self.current_expression
+        if not full_expression: return
+        try:
+            # the engine reads 015 as 15 where eval() refused leading zeros; that is kept on purpose
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", SyntaxWarning)  # "2(3)" warns before it fails
+                result = eval(re.sub(r"(?<![\d.])0+(?=\d)", "", full_expression), {"__builtins__": {}})
+            formatted = int(result) if result == int(result) else f"{result:.4f}"
+            self.history.append(f"{full_expression.replace('**', '^').replace('/', '÷').replace('*', '×')} = {formatted}")
+            self.current_expression = str(formatted)
+        except Exception:
+            self.current_expression = "Hata"
+        self.total_expression = ""
+
+    def toggle_sign(self):
+        if not self.current_expression: return
+        self.current_expression = self.current_expression[1:] if self.current_expression.startswith('-') else '-' + self.current_expression
+
+
+NUMBERS = ("0", "2", "7", "15", "0.5", "2.5")
+OPERATORS = ("+", "-", "*", "/", "%", "**", "(", ")")
+
+
+def press(logic, key):
+    if key == "=": logic.evaluate()
+    elif key == "C": logic.clear()
+    elif key == "DEL": logic.delete_last()
+    elif key == "+/-": logic.toggle_sign()
+    elif key in OPERATORS: logic.append_operator(key)
+    else: logic.add_to_expression(key)
+
+
+def random_keys(rng, operators=OPERATORS, length=12):
+    keys = []
+    for _ in range(length):
+        r = rng.random()
+        if r < 0.45: keys.append(rng.choice(NUMBERS))
+        elif r < 0.85: keys.append(rng.choice(operators if rng.random() < 0.2 else operators[:5]))
+        elif r < 0.93: keys.append("=")
+        else: keys.append(rng.choice(("C", "DEL", "+/-")))
+    return keys + ["="]
+
+
+class KeySequenceTest(unittest.TestCase):
+    def assert_like_baseline(self, keys):
+        logic, baseline = CalculationLogic(), BaselineLogic()
+        for key in keys:
+            # int ** int ** int can take the baseline minutes; the engine refuses it instead
+            if key == "=" and (baseline.total_expression + baseline.current_expression).count("**") > 1:
+                logic.clear(), baseline.clear()
+                continue
+            press(logic, key), press(baseline, key)
+            state = (logic.current_expression, logic.total_expression)
+            self.assertEqual(state, (baseline.current_expression, baseline.total_expression), keys)
+        self.assertEqual(list(map(str, logic.history)), baseline.history, keys)
+
+    def test_random_sequences_match_baseline(self):
+        rng = random.Random(9)
+        for _ in range(2000):
+            self.assert_like_baseline(random_keys(rng))
+
+    def test_basic_sequences(self):
+        for keys in (["15", "*", "2", "="], ["7", "/", "2", "="], ["2", "**", "10", "="], ["1", "/", "0", "="],
+                     ["(", "2", "+", "3", ")", "*", "4", "="], ["15", "+/-", "-", "2", "="], ["15", "+", "="]):
+            self.assert_like_baseline(keys)
+
+    def test_doubled_operators(self):
+        # two "*" or "/" presses are ** and //, as in the string-built expressions
+        for keys in (["15", "*", "*", "2", "="], ["15", "/", "/", "2", "="], ["7", "/", "/", "-", "2", "="],
+                     ["15", "*", "*", "*", "2", "="], ["2", "=", "*", "+/-", "*", "0.5", "="]):
+            self.assert_like_baseline(keys)
+        logic = CalculationLogic()
+        for key in ("15", "*", "*"): press(logic, key)
+        self.assertEqual(logic.total_expression, "15**")
+        self.assertEqual(logic.total_display, "15 ^ ")
+        logic.total_expression = logic.total_expression
+        self.assertEqual(logic.total_display, "15 ^ ")
+
+    def test_scientific_buttons(self):
+        logic = CalculationLogic()
+        for value, method, expected in (("16", "calculate_sqrt", "4"), ("-4", "calculate_sqrt", "Hata"),
+                                        ("5", "calculate_factorial", "120"), ("30", "trigo_sin", "0.5000"),
+                                        ("100", "calculate_log", "2"), ("0", "calculate_ln", "Hata")):
+            logic.current_expression = value
+            getattr(logic, method)()
+            self.assertEqual(logic.current_expression, expected, (value, method))
+
+
+class BackendTest(unittest.TestCase):
+    def test_exact_backends(self):
+        self.assertEqual(evaluate_text("1/3 + 1/6", "fraction"), "1/2")
+        self.assertEqual(evaluate_text("0.1 + 0.2", "decimal"), "0.3")
+        self.assertEqual(evaluate_text("1/3", "decimal", 10), "0.3333333333")
+        self.assertEqual(evaluate_expression("2**100", "fraction"), 2 ** 100)
+
+    def test_huge_decimals_are_scientific(self):
+        # rendered from the exponent, not through a million-digit int
+        self.assertEqual(evaluate_text("1e999999", "decimal"), "1.000000e+999999")
+        self.assertEqual(evaluate_text("-1.5 * 10**5000", "decimal"), "-1.500000e+5000")
+        self.assertEqual(evaluate_text("2**10", "decimal"), "1024")
+        for text in ("1e-999999", "0.1**999999", "1/10**999999"):
+            self.assertEqual(evaluate_text(text, "decimal"), "1.000000e-999999", text)
+
+    def test_huge_fractions_are_scientific(self):
+        self.assertEqual(evaluate_text("(1/3)**10000", "fraction"), "6.129892e-4772")
+        self.assertEqual(evaluate_text("-(2/3)**10000", "fraction"), "-1.222952e-1761")
+        self.assertEqual(evaluate_text("(1/3)**10", "fraction"), "1/59049")
+
+    def test_modulo_floors_on_every_backend(self):
+        for text, expected in (("-7%3", "2"), ("7%-3", "-2"), ("-7//2", "-4"), ("7//-2", "-4")):
+            self.assertEqual([evaluate_text(text, backend) for backend in ("float", "decimal", "fraction")], [expected] * 3, text)
+        logic = CalculationLogic("decimal")
+        logic.define_formula("m(x, y) = x % y")
+        self.assertEqual(logic.evaluate_formula("m", "-7", "3"), "2")
+
+    def test_scientific_buttons_keep_exact_backends(self):
+        logic = CalculationLogic("decimal", 30)
+        logic.add_to_expression("2")
+        logic.calculate_sqrt()
+        self.assertEqual(logic.current_expression, "1.41421356237309504880168872421")
+        self.assertEqual(evaluate_text("sqrt(2)", "decimal", 30), "1.41421356237309504880168872421")
+        self.assertEqual(evaluate_text("log(1000) + ln(1)", "decimal"), "3")
+        logic.current_expression = "1e400"
+        logic.calculate_sqrt()
+        self.assertEqual(logic.current_expression, "1" + "0" * 200)
+        logic = CalculationLogic("fraction")
+        for key in ("2", "SQRT", "**", "2", "="):
+            if key == "SQRT": logic.calculate_sqrt()
+            else: press(logic, key)
+        self.assertAlmostEqual(float(Fraction(logic.current_expression)), 2.0, places=12)  # not 49999041/25000000
+        logic.current_expression = "30"
+        logic.trigo_sin()
+        self.assertEqual(logic.current_expression, "1/2")
+
+    def test_large_factorials_agree_with_the_button(self):
+        logic = CalculationLogic()
+        for n, expected in (("170", None), ("5000", "4.228578e+16325"), ("100000", "2.824229e+456573")):
+            logic.current_expression = n
+            logic.calculate_factorial()
+            self.assertEqual(logic.current_expression, evaluate_text(f"{n}!"), n)
+            if expected: self.assertEqual(logic.current_expression, expected, n)
+        self.assertEqual(evaluate_text("100000! / 2"), "1.412115e+456573")
+        self.assertEqual(evaluate_expression("20!", "fraction"), math.factorial(20))
+
+    def test_errors_are_hata(self):
+        for backend in ("float", "decimal", "fraction"):
+            for text in ("1/0", "sqrt(-1)", "2 +", "9**9**9", "import os"):
+                self.assertEqual(evaluate_text(text, backend), "Hata", (text, backend))
+
+    def test_complex_backend(self):
+        self.assertEqual(evaluate_text("sqrt(-4)", "complex"), "2i")
+        self.assertEqual(evaluate_text("(1+2i)*(3-i)", "complex"), "5+5i")
+        self.assertEqual(evaluate_text("sqrt(9)!", "complex"), "6")
+
+    def test_toggle_sign_negates_complex_results(self):
+        logic = CalculationLogic("complex")
+        for keys, expected in ((["3", "+", "4i", "=", "+/-"], "-3-4i"), (["="], "-3-4i"), (["+/-", "+/-"], "-3-4i"),
+                               (["C", "5", "+/-"], "-5"), (["C", "2i", "+/-"], "-2i")):
+            for key in keys: press(logic, key)
+            self.assertEqual(logic.current_expression, expected, keys)
+
+    def test_polar_results_are_operands(self):
+        logic = CalculationLogic("complex")
+        logic.set_complex_display("polar")
+        for keys, expected in ((["2", "+", "3", "="], "5∠0°"), (["+", "1", "="], "6∠0°"), (["C", "-4", "SQRT"], "2∠90°"),
+                               (["*", "2", "="], "4∠90°"), (["+/-", "+", "4i", "="], "0∠0°"), (["C", "3", "+", "4i", "="], "5∠53.1301°")):
+            for key in keys:
+                if key == "SQRT": logic.calculate_sqrt()
+                else: press(logic, key)
+            self.assertEqual(logic.current_expression, expected, keys)
+        logic.toggle_complex_display()
+        self.assertEqual(logic.current_expression, "3+4i")
+
+    def test_formulas_follow_the_backend(self):
+        logic = CalculationLogic("fraction")
+        logic.define_formula("f(x, y) = x / y + 1")
+        self.assertEqual(logic.evaluate_formula("f", "1", "3"), "4/3")
+        self.assertEqual(logic.evaluate_formula("f", "1/2", y=2), "5/4")
+        self.assertEqual(logic.evaluate_formula("f", "1", "0"), "Hata")
+        self.assertEqual(logic.evaluate_formula("f", 1, 0.5), "3")
+        self.assertEqual(logic.evaluate_formula("f", 0.1, y=Fraction(1, 2)), "6/5")
+        logic = CalculationLogic("decimal")
+        logic.define_formula("g(x) = x + 0.2")
+        self.assertEqual([logic.evaluate_formula("g", x) for x in (0.1, 1, Fraction(1, 4))], ["0.3", "1.2", "0.45"])
+        self.assertEqual(list(logic.evaluate_formula_many("g", [(0.1,), {"x": 2.5}])), ["0.3", "2.7"])
+
+
+class UnitsTest(unittest.TestCase):
+    def test_derived_units_chain(self):
+        logic = CalculationLogic()
+        for keys, expected in ((["10 m", "/", "4 s", "="], "2.5000 m/s"), (["*", "2", "="], "5 m/s"), (["+/-", "+", "1 m", "/", "1 s", "="], "-4 m/s"),
+                               (["C", "3 m", "*", "2 m", "="], "6 m^2"), (["/", "2 m", "="], "3 m"), (["C", "1", "/", "4 s", "="], "0.2500 1/s"),
+                               (["*", "8 s", "="], "2"), (["C", "5 km", "+", "300 m", "="], "5.3000 km"), (["*", "2", "="], "10.6000 km")):
+            for key in keys: press(logic, key)
+            self.assertEqual(logic.current_expression, expected, keys)
+        self.assertEqual(quantity_operand("2.5000", "m*kg/s^2"), "2.5000*(1 m)*(1 kg)/(1 s)**2")
+        self.assertEqual(evaluate_text(quantity_operand("2", "km^2^3")), "2 km^6")
+
+
+class BatchTest(unittest.TestCase):
+    def test_evaluate_many(self):
+        logic = CalculationLogic()
+        lines = ["1 + 2\n", "\n", "   ", "2 *", "7 / 2", "1 / 0", "sqrt(16)\n"]
+        self.assertEqual(list(logic.evaluate_many(lines)), ["3", "", "", "Hata", "3.5000", "Hata", "4"])
+        self.assertEqual((list(logic.history), logic.current_expression), ([], ""))
+        self.assertEqual(list(CalculationLogic("fraction").evaluate_many(["1/3 + 1/6", "(1"])), ["1/2", "Hata"])
+
+    def test_run_batch(self):
+        output = io.StringIO()
+        run_batch(io.StringIO("2 ** 10\n\n3 +\n10 % 4\n"), output)
+        self.assertEqual(output.getvalue(), "1024\n\nHata\n2\n")
+
+    def test_run_batch_streams(self):
+        read, written = [], []
+
+        def source():
+            for i in range(5):
+                read.append(i)
+                yield f"{i} * 2\n"
+        output = io.StringIO()
+        output.write = lambda text: written.append((len(read), text))
+        run_batch(source(), output)
+        # each result is written before the next line is read
+        self.assertEqual(written, [(i + 1, f"{i * 2}\n") for i in range(5)])
+
+    def test_invalid_formula_is_a_usage_error(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "args.txt")
+            with open(path, "w", encoding="utf-8") as f: f.write("1\n")
+            for definition in ("f(x) = x +", "f(x) = y", "f(x) = x km"):
+                stderr = io.StringIO()
+                with self.assertRaises(SystemExit), contextlib.redirect_stderr(stderr):
+                    main(["--batch", path, "--formula", definition, "--output", os.path.join(directory, "out.txt")])
+                self.assertIn("--formula: ", stderr.getvalue(), definition)
+
+
+class ParallelTest(unittest.TestCase):
+    def test_results_keep_the_input_order(self):
+        lines = [f"{i} * 3 / 2" if i % 7 else "" for i in range(50)] + ["2 +", "1/0", "sqrt(2)"]
+        expected = list(CalculationLogic().evaluate_many(lines))
+        self.assertEqual(list(evaluate_parallel(lines, workers=2, chunk_size=3)), expected)
+        self.assertEqual(list(evaluate_parallel(lines, workers=2, chunk_size=100)), expected)
+
+    def test_pending_chunks_are_bounded(self):
+        read = []
+
+        def source():
+            for i in range(40):
+                read.append(i)
+                yield str(i)
+        results = evaluate_parallel(source(), workers=2, chunk_size=2, max_pending=3)
+        self.assertEqual(next(results), "0")
+        self.assertLessEqual(len(read), 3 * 2)
+        self.assertEqual(list(results), [str(i) for i in range(1, 40)])
+
+    def test_batch_workers_and_chunk_size(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "exprs.txt")
+            with open(path, "w", encoding="utf-8") as f: f.write("".join(f"{i}**2 - 1\n" for i in range(25)) + "\n3 +\n")
+            outputs = []
+            for options in ([], ["--workers", "2", "--chunk-size", "4"], ["--workers", "2", "--chunk-size", "1"]):
+                output = os.path.join(directory, "out.txt")
+                main(["--batch", path, "--output", output, *options])
+                with open(output, encoding="utf-8") as f: outputs.append(f.read())
+            self.assertEqual(outputs[0].splitlines(), [str(i * i - 1) for i in range(25)] + ["", "Hata"])
+            self.assertEqual(outputs[1:], outputs[:1] * 2)
+
+
+class CostEstimateTest(unittest.TestCase):
+    def test_small_results_stay_inline(self):
+        for text in ("2**3", "3!", "2**3!", "(2**10+1)**2", "2.5**10000", "1/3**2", "2+"):
+            self.assertLessEqual(estimate_bits(tokenize(text)), INLINE_RESULT_BITS, text)
+        for text in ("9**9**9", "100000!", "2**1000000", "x**2", "[1, 2] @ [3; 4]"):
+            self.assertGreater(estimate_bits(tokenize(text)), INLINE_RESULT_BITS, text)
+        self.assertGreater(estimate_bits(tokenize("(1/3)**100000"), "fraction"), INLINE_RESULT_BITS)
+
+    def test_decimal_results_are_bounded_by_their_exponent(self):
+        for text in ("1e999999", "10**999999", "2.5e50000 * 3"):
+            self.assertTrue(is_expensive(tokenize(text), "decimal"), text)
+            self.assertGreater(estimate_bits(tokenize(text), "decimal"), INLINE_RESULT_BITS, text)
+        for text in ("1/3", "0.1 + 0.2", "2**10", "1e-999999"):
+            self.assertLessEqual(estimate_bits(tokenize(text), "decimal"), INLINE_RESULT_BITS, text)
+        self.assertFalse(is_expensive(tokenize("1e999"), "float"))
+
+    def test_estimate_bounds_exact_results(self):
+        rng = random.Random(17)
+        for _ in range(300):
+            text = f"({rng.randrange(1, 50)}{rng.choice(('**', '*', '+', '-', '%', '//'))}{rng.randrange(1, 9)})"
+            text = f"{text}{rng.choice(('**', '*', '+'))}{rng.choice((text, str(rng.randrange(1, 6)), '3!'))}"
+            try:
+                result = evaluate_expression(text, "fraction")
+            except TooExpensiveError:
+                continue
+            size = math.log2(max(abs(result.numerator), 1)) + math.log2(result.denominator)
+            self.assertLessEqual(size, estimate_bits(tokenize(text), "fraction") + 1e-9, text)
+
+
+class OptimizerTest(unittest.TestCase):
+    def test_folding_and_identities(self):
+        self.assertEqual(optimize(parse("x*1")), ("var", "x"))
+        self.assertEqual(optimize(parse("0+x")), ("var", "x"))
+        self.assertEqual(optimize(parse("2*3+x")), ("bin", "+", ("const", 6), ("var", "x")))
+        self.assertEqual(optimize(parse("1/0+x"))[2][0], "bin")  # left for run time to report
+
+    def test_optimized_trees_evaluate_like_python(self):
+        rng = random.Random(18)
+        for _ in range(500):
+            text = "x"
+            for _ in range(rng.randrange(1, 5)):
+                operand = rng.choice(("x", "1", "0", "2", "(x+1)", "0.5"))
+                text = f"({text}{rng.choice('+-*/')}{operand})" if rng.random() < 0.5 else f"({operand}{rng.choice('+-*/')}{text})"
+            for x in (3, 0.25, Fraction(1, 3)):
+                try:
+                    expected = eval(text, {"x": x})
+                except ZeroDivisionError:
+                    continue
+                backend = "fraction" if isinstance(x, Fraction) else "float"
+                actual = compile_tree(parse(text), backend, ("x",))({"x": x})
+                self.assertTrue(math.isclose(actual, expected, rel_tol=1e-12), (text, x, actual, expected))
+
+
+class HistoryStoreTest(unittest.TestCase):
+    def test_compact_history_checks_bounds(self):
+        history = CompactHistory()
+        history.add("2**10", 1024)
+        history.add("1/4", 0.25)
+        self.assertEqual((history[0], history[-1], history[-2]), ("2^10 = 1024", "1÷4 = 0.2500", "2^10 = 1024"))
+        for i in (2, -3, -5):
+            with self.assertRaises(IndexError): history[i]
+            with self.assertRaises(IndexError): history.record(i)
+
+    def test_reads_back_and_checks_bounds(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "history.bin")
+            store = HistoryStore(path, memory_window=1)
+            with self.assertRaises(IndexError): store.timestamp(0)
+            store.add("2**10", 1024, timestamp=5.0)
+            store.add("1/4", 0.25, timestamp=6.0)
+            self.assertEqual((store[0], store[-1], store.timestamp(0), store.timestamp(-1)), ("2^10 = 1024", "1÷4 = 0.2500", 5.0, 6.0))
+            for i in (2, -3):
+                with self.assertRaises(IndexError): store.timestamp(i)
+                with self.assertRaises(IndexError): store[i]
+            store.close()
+            store = HistoryStore(path)
+            self.assertEqual(list(store), ["2^10 = 1024", "1÷4 = 0.2500"])
+            store.close()
+
+
+class PipelineTest(unittest.TestCase):
+    modes = (False, True) if np is not None else (False,)  # vectorized needs numpy
+
+    def test_csv_result_column(self):
+        for vectorized in self.modes:
+            output = io.StringIO()
+            stats = run_pipeline(io.StringIO("x,y\n3,4\n1,a\n"), output, "sqrt(x**2 + y**2)", chunk_rows=1, vectorized=vectorized)
+            self.assertEqual(output.getvalue(), "x,y,result\n3,4,5\n1,a,Hata\n")
+            self.assertEqual((stats.rows, stats.errors), (2, 1))
+
+    def test_angle_mode(self):
+        for vectorized in self.modes:
+            output = io.StringIO()
+            run_pipeline(io.StringIO("x\n90\n"), output, "sin(x)", vectorized=vectorized)
+            run_pipeline(io.StringIO("x\n0.5\n"), output, "sin(x)", vectorized=vectorized, angle="rad")
+            self.assertEqual(output.getvalue(), "x,result\n90,1\nx,result\n0.5,0.4794\n")
+
+    def test_expression_errors(self):
+        for vectorized in self.modes:
+            for expression in ("x km", "[x, 1]", "x, 1", "x +", "y + 1"):
+                with self.assertRaises(ExpressionError, msg=expression):
+                    run_pipeline(io.StringIO("x\n1\n"), io.StringIO(), expression, vectorized=vectorized)
+
+    def test_non_real_and_overflowing_rows(self):
+        for vectorized in self.modes:
+            output = io.StringIO()
+            stats = run_pipeline(io.StringIO("x\n-8\n4\n1e308\n"), output, "x**0.5 + x*10", vectorized=vectorized)
+            self.assertEqual(output.getvalue(), "x,result\n-8,Hata\n4,42\n1e308,Hata\n")
+            self.assertEqual((stats.rows, stats.errors), (3, 2))
+
+    def test_factorial_limit(self):
+        for vectorized in self.modes:
+            output = io.StringIO()
+            stats = run_pipeline(io.StringIO("n\n5\n171\n"), output, "n!", vectorized=vectorized)
+            self.assertEqual(output.getvalue(), "n,result\n5,120\n171,Hata\n")
+            self.assertEqual(stats.errors, 1)
+
+    def test_reserved_column_names(self):
+        for vectorized in self.modes:
+            for header in ("_c2", "lambda"):
+                with self.assertRaises(ExpressionError, msg=header):
+                    run_pipeline(io.StringIO(f"{header}\n5\n"), io.StringIO(), f"{header} + 1", vectorized=vectorized)
+
+    def test_header_only_csv(self):
+        for vectorized in self.modes:
+            output = io.StringIO()
+            run_pipeline(io.StringIO("x,y\n"), output, "x + y", vectorized=vectorized)
+            self.assertEqual(output.getvalue(), "x,y,result\n")
+            with self.assertRaises(ValueError): run_pipeline(io.StringIO("x,y\n"), io.StringIO(), "z + 1", vectorized=vectorized)
+
+
+@unittest.skipIf(np is None, "matrix expressions need numpy")
+class MatrixTest(unittest.TestCase):
+    def test_results_are_not_shared(self):
+        logic = CalculationLogic()
+        for text in ("[1, 2]", "+[1, 2]", "transpose([1, 2; 3, 4])"):
+            first = logic.evaluate_matrix(text)
+            expected = first.copy()
+            first[0] = 99
+            self.assertEqual(logic.evaluate_matrix(text).tolist(), expected.tolist(), text)
+        a = np.array([[2.0, 0.0], [0.0, 4.0]])
+        for text in ("A", "transpose(A)"):
+            result = logic.evaluate_matrix(text, A=a)
+            self.assertFalse(np.may_share_memory(result, a), text)
+
+    def test_function_arity(self):
+        logic, a, b = CalculationLogic(), np.array([4.0, 9.0]), np.array([1.0, 1.0])
+        for text in ("sqrt(A, B)", "log(A, B)", "ln(A, B)", "transpose(A, B)", "solve(A)", "solve(A, B, B)"):
+            with self.assertRaises(ExpressionError, msg=text): logic.evaluate_matrix(text, A=a, B=b)
+        self.assertEqual((a.tolist(), b.tolist()), ([4.0, 9.0], [1.0, 1.0]))
+        self.assertEqual(logic.evaluate_matrix("solve([2, 0; 0, 4], [2, 8])").tolist(), [1.0, 2.0])
+        self.assertEqual(logic.evaluate_matrix("sqrt(A)", A=a).tolist(), [2.0, 3.0])
+
+
+class ServiceTest(unittest.TestCase):
+    def exchange(self, data, limit):
+        async def run():
+            service = EvaluationService()
+            server = await asyncio.start_server(service.handle, "127.0.0.1", 0, limit=limit)
+            async with server:
+                reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+                writer.write(data)
+                writer.write_eof()
+                answer = await asyncio.wait_for(reader.read(), 10)
+                writer.close()
+            service.close()
+            return answer.decode("utf-8")
+        return asyncio.run(run())
+
+    def test_pipelined_lines(self):
+        self.assertEqual(self.exchange(b'2+3\n1/0\n{"id": 1, "batch": ["sqrt(16)"]}\n', 1024),
+                         '5\nHata\n{"id": 1, "results": ["4"]}\n')
+
+    def test_angle_mode(self):
+        async def run(angle):
+            service = EvaluationService(angle=angle)
+            return await service.evaluate("sin(0.5)")
+        self.assertEqual((asyncio.run(run("deg")), asyncio.run(run("rad"))), ("0.0087", "0.4794"))
+
+    def test_only_unbounded_expressions_leave_the_loop(self):
+        self.assertEqual([is_slow(text) for text in ("2**3", "3!", "9**9**9", "100000!", "2 +")], [False, False, True, True, False])
+        self.assertEqual([is_slow("1e999999", backend) for backend in ("float", "decimal")], [False, True])
+
+    def test_over_long_line_is_answered(self):
+        answer = self.exchange(b"2+3\n" + b"9" * 200 + b"\n4*4\n", 64)
+        self.assertEqual(answer, '5\n{"error": "bad request: line too long"}\n')
+
+
+class MetricsTest(unittest.TestCase):
+    def test_percentiles_are_within_the_bucket_precision(self):
+        values = [k * 1000 for k in range(1, 10001)]
+        random.Random(3).shuffle(values)
+        histogram = LatencyHistogram()
+        for value in values: histogram.record(value)
+        for percent in (1, 50, 90, 99, 99.9, 100):
+            exact = percent * 100 * 1000
+            self.assertLessEqual(abs(histogram.percentile(percent) - exact), exact / 64, percent)
+        self.assertEqual((histogram.count, histogram.total, histogram.max), (10000, sum(values), 10000000))
+        histogram = LatencyHistogram()
+        for value in range(1, 101): histogram.record(value)
+        self.assertEqual((histogram.percentile(50), histogram.percentile(99)), (50, 99))
+        self.assertEqual(LatencyHistogram().percentile(50), 0)
+
+    def test_json_and_prometheus(self):
+        metrics = CommandMetrics()
+        for k in range(1, 1001): metrics.record("add_to_expression", k * 1000, k * 100)
+        metrics.record("_evaluate", 2000000)
+        summary = json.loads(metrics.to_json())
+        self.assertEqual(sorted(summary), ["_evaluate", "add_to_expression"])
+        logic, display = summary["add_to_expression"]["logic"], summary["add_to_expression"]["display"]
+        self.assertEqual((logic["count"], logic["mean_us"], logic["max_us"], display["max_us"]), (1000, 500.5, 1000.0, 100.0))
+        self.assertLessEqual(abs(logic["p50_us"] - 500), 500 / 64)
+        self.assertLessEqual(abs(logic["p99_us"] - 990), 990 / 64)
+        self.assertEqual(summary["_evaluate"]["display"]["count"], 0)
+        lines = metrics.to_prometheus().splitlines()
+        self.assertEqual(lines[1], "# TYPE calc_command_latency_seconds summary")
+        samples = dict(line.rsplit(" ", 1) for line in lines[2:])
+        labels = 'command="add_to_expression",phase="logic"'
+        self.assertLessEqual(abs(float(samples[f'calc_command_latency_seconds{{{labels},quantile="0.99"}}']) - 0.00099), 0.00099 / 64)
+        self.assertEqual(samples[f"calc_command_latency_seconds_sum{{{labels}}}"], "0.500500000")
+        self.assertEqual(samples[f"calc_command_latency_seconds_count{{{labels}}}"], "1000")
+        self.assertEqual(samples['calc_command_latency_seconds{command="_evaluate",phase="logic",quantile="0.5"}'], "0.002000000")
+        self.assertEqual(len(samples), 2 * 2 * 4)
+        with tempfile.TemporaryDirectory() as directory:
+            for name, expected in (("metrics.prom", metrics.to_prometheus()), ("metrics.json", metrics.to_json())):
+                metrics.save(os.path.join(directory, name))
+                with open(os.path.join(directory, name), encoding="utf-8") as f: self.assertEqual(f.read(), expected)
+
+
+class TraceTest(unittest.TestCase):
+    def test_replay_reports_the_recorded_mode(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "session.trace")
+            logic = CalculationLogic(angle_unit="rad")
+            recorder = TraceRecorder(path, logic)
+            for name, args in (("add_to_expression", ("0",)), ("trigo_cos", ()), ("evaluate", ())):
+                getattr(logic, name)(*args)
+                recorder.record(name, args)
+            recorder.close(logic)
+            report = replay(path, CalculationLogic(angle_unit="rad"))
+            self.assertEqual((report.diffs(), report.settings_diffs()), ([], []))
+            report = replay(path, CalculationLogic())
+            self.assertEqual(report.settings_diffs(), [("angle_unit", "rad", "deg")])
+
+
+class StubWindow:
+    def __init__(self):
+        self.callbacks = []
+
+    def after(self, ms, callback):
+        self.callbacks.append(callback)
+
+
+class StubLabel:
+    def __init__(self):
+        self.texts = []
+
+    def configure(self, text):
+        self.texts.append(text)
+
+
+class StubWorker:
+    # evaluates on submit; the job reports ready only once the test says so
+    def __init__(self):
+        self.jobs, self.cancelled = [], 0
+
+    def submit(self, tokens, backend="float", precision=None, angle="deg"):
+        job = type("Job", (), {"done": False, "ready": lambda job: job.done})()
+        job.get = lambda result=evaluate_tokens(tokens, backend, precision, angle): result
+        self.jobs.append(job)
+        return job
+
+    def cancel(self):
+        self.cancelled += 1
+
+
+@unittest.skipIf(calc_ui is None, "the window needs customtkinter")
+class WindowTest(unittest.TestCase):
+    def make_ui(self, metrics=None):
+        # the window's state without any widgets, as in bench_update_display
+        ui = calc_ui.CalculatorUI.__new__(calc_ui.CalculatorUI)
+        ui._init_state(StubWindow(), CalculationLogic(), metrics)
+        ui.label, ui.total_label, ui.worker = StubLabel(), StubLabel(), StubWorker()
+        return ui
+
+    def press(self, ui, *keys):
+        for key in keys:
+            if key == "=": func, args = ui._evaluate, ()
+            elif key == "AC": func, args = ui._clear, ()
+            elif key == "DEL": func, args = ui.logic.delete_last, ()
+            elif key == "+/-": func, args = ui.logic.toggle_sign, ()
+            elif key in OPERATORS: func, args = ui.logic.append_operator, (key,)
+            else: func, args = ui.logic.add_to_expression, (key,)
+            ui._make_command(func, *args)()
+
+    def run_frame(self, ui):
+        callbacks, ui.window.callbacks = ui.window.callbacks, []
+        for callback in callbacks: callback()
+
+    def test_key_bursts_are_drawn_once_per_frame(self):
+        ui = self.make_ui(CommandMetrics())
+        self.press(ui, *"12345", "+", "6", "7")
+        self.assertEqual(len(ui.window.callbacks), 1)
+        self.run_frame(ui)
+        self.assertEqual((ui.redraw_count, ui.label.texts, ui.total_label.texts), (1, ["67"], ["12345+"]))
+        self.press(ui, "DEL", "7")
+        self.run_frame(ui)
+        # an unchanged display costs a flush but no configure call
+        self.assertEqual((ui.redraw_count, len(ui.label.texts), len(ui.total_label.texts)), (2, 1, 1))
+        self.press(ui, "=")
+        self.run_frame(ui)
+        self.assertEqual((ui.redraw_count, ui.label.texts[-1], ui.total_label.texts[-1]), (3, "12412", ""))
+        self.assertEqual(ui.window.callbacks, [])
+        # each flush is timed once, under the last command before it
+        displays = {command: phases["display"]["count"] for command, phases in ui.metrics.summary().items()}
+        self.assertEqual(displays, {"add_to_expression": 2, "append_operator": 0, "delete_last": 0, "_evaluate": 1})
+
+    def test_input_is_ignored_while_evaluating(self):
+        ui = self.make_ui()
+        self.press(ui, "2", "**", "100000", "=")
+        self.assertIsNotNone(ui._evaluation)
+        self.press(ui, "7", "+", "DEL", "+/-", "=")
+        self.assertEqual((ui.logic.current_expression, ui.logic.total_expression, len(ui.worker.jobs)), ("100000", "2**", 1))
+        ui.worker.jobs[0].done = True
+        ui._poll_evaluation()
+        self.assertEqual((ui.logic.current_expression, ui.logic.total_expression), (evaluate_text("2**100000"), ""))
+        self.press(ui, "AC", "4", "+", "1", "=")
+        self.assertEqual(ui.logic.current_expression, "5")
+
+    def test_ac_cancels_the_evaluation(self):
+        ui = self.make_ui()
+        self.press(ui, "2", "**", "100000", "=", "AC", "3")
+        self.assertEqual((ui._evaluation, ui.worker.cancelled, ui.logic.current_expression), (None, 1, "3"))
+
+
+if __name__ == "__main__":
+    unittest.main()